@@ -222,8 +222,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
 from extractors import (extract_synlab_biology, extract_lims_biology, detect_pdf_lab_format,
-                        extract_idk_microbiome, extract_microbiome_from_excel)
-from rules_engine import RulesEngine
+                        extract_idk_microbiome, extract_microbiome_from_excel, open_pdf_document)
+from rules_engine import RulesEngineReloader
 
 try:
     from pdf_generator import generate_multimodal_report
@@ -644,12 +644,18 @@ def _build_display_recommendations(consolidated: dict) -> dict:
 
 
 @st.cache_resource
+def _get_rules_reloader():
+    # Partagé par toutes les sessions ; recharge le classeur en arrière-plan s'il change.
+    # Règlement colonnaire mappé : les workers partagent le même fichier en mémoire
+    return RulesEngineReloader(RULES_EXCEL_PATH, columnar=True).start()
+
+
 def _get_rules_engine():
     if not os.path.exists(RULES_EXCEL_PATH):
         st.error(f"❌ Fichier de règles introuvable: {RULES_EXCEL_PATH}")
         return None
     try:
-        return RulesEngine(RULES_EXCEL_PATH)
+        return _get_rules_reloader().engine
     except Exception as e:
         st.error(f"❌ Erreur chargement règles: {e}")
         return None
@@ -1242,11 +1248,13 @@ with tab1:
                     
                     if bio_pdf:
                         bio_path = _file_to_temp_path(bio_pdf, ".pdf")
-                        lab_format = detect_pdf_lab_format(bio_path)
-                        if lab_format == "lims":
-                            biology_dict = extract_lims_biology(bio_path)
-                        else:
-                            biology_dict = extract_synlab_biology(bio_path)
+                        # Un seul parsing du PDF pour la détection et l'extraction
+                        with open_pdf_document(bio_path) as bio_doc:
+                            lab_format = detect_pdf_lab_format(bio_doc)
+                            if lab_format == "lims":
+                                biology_dict = extract_lims_biology(bio_doc)
+                            else:
+                                biology_dict = extract_synlab_biology(bio_doc)
                     
                     if bio_excel:
                         bio_excel_path = _file_to_temp_path(bio_excel, ".xlsx")
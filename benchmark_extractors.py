@@ -0,0 +1,212 @@
+"""
+ALGO-LIFE - Benchmark du parsing des lignes Synlab / Unilabs
+
+Compare le scanner compilé de extractors (_parse_synlab_lines : motif de bruit unique,
+alternance Belge / Français avec / sans parenthèses en une passe) à l'implémentation
+historique conservée ci-dessous (13 re.search de bruit + 3 regex essayées à la suite).
+Le texte des PDF est lu une fois ; seul le parsing des lignes est chronométré, et les
+deux sorties doivent être identiques (code retour 1 sinon).
+
+Corpus : comptes rendus PDF (fichiers ou dossiers) et/ou lignes synthétiques.
+
+    python benchmark_extractors.py rapports/
+    python benchmark_extractors.py --synthetic 20000 --repeat 5 --json out.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("ALGOLIFE_EXTRACT_CACHE", "0")
+
+import extractors  # noqa: E402
+from extractors import (_IGNORE_PATTERNS, _clean_ref, _get_default_reference,  # noqa: E402
+                        _safe_float, determine_biomarker_status)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Implémentation historique (référence)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _legacy_is_noise_line(line):
+    if not line:
+        return True
+    s = line.strip()
+    if len(s) < 4:
+        return True
+    for pat in _IGNORE_PATTERNS:
+        if re.search(pat, s, flags=re.IGNORECASE):
+            return True
+    return False
+
+
+def legacy_parse_synlab_lines(lines):
+    out = {}
+    pat_fr_parens = re.compile(
+        r"^(?P<n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
+        r"(?P<value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s*"
+        r"(?P<unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s*"
+        r"\((?P<ref>[^)]+)\)",
+        flags=re.UNICODE,
+    )
+    pat_fr_no_parens = re.compile(
+        r"^(?P<n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
+        r"(?P<value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s+"
+        r"(?P<unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s+"
+        r"(?P<ref>\d+(?:[.,]\d+)?\s*[-—–]\s*\d+(?:[.,]\d+)?)",
+        flags=re.UNICODE,
+    )
+    pat_be = re.compile(
+        r"^(?:>\s*)?"
+        r"(?P<n>[A-Za-zÀ-ÿ0-9\.\-\/\s]{3,60}?)\s+"
+        r"(?P<valsign>[\+\-])?\s*(?P<value>\d+(?:[.,]\d+)?)\s+"
+        r"(?P<ref>\d+(?:[.,]\d+)?\s*-\s*\d+(?:[.,]\d+)?)\s+"
+        r"(?P<unit>[A-Za-zµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)\s*$",
+        flags=re.UNICODE,
+    )
+    for ln in lines:
+        if _legacy_is_noise_line(ln):
+            continue
+        for pat, siemens in ((pat_be, False), (pat_fr_parens, True), (pat_fr_no_parens, True)):
+            m = pat.match(ln)
+            if m:
+                break
+        else:
+            continue
+        name = m.group("n").strip()
+        if siemens and re.search(r"\bSIEMENS\b", name, flags=re.IGNORECASE):
+            continue
+        unit = (m.group("unit") or "").strip()
+        ref = _clean_ref(m.group("ref"))
+        value_float = _safe_float(m.group("value"))
+        out[name] = {"value": value_float, "unit": unit, "reference": ref,
+                     "status": determine_biomarker_status(value_float, ref, name)}
+    for biomarker_name, data in out.items():
+        if not data.get("reference"):
+            default_ref = _get_default_reference(biomarker_name)
+            if default_ref:
+                data["reference"] = default_ref
+                data["status"] = determine_biomarker_status(data.get("value"), default_ref, biomarker_name)
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Corpus
+# ─────────────────────────────────────────────────────────────────────────────
+
+NAMES = ["GLUCOSE", "CHOLESTEROL TOTAL", "HDL CHOLESTEROL", "LDL CHOLESTEROL", "TRIGLYCERIDES",
+         "CREATININE", "FERRITINE", "VITAMINE D", "TSH", "CRP ULTRASENSIBLE", "MAGNÉSIUM",
+         "ZINC", "HOMOCYSTÉINE", "INSULINE", "HBA1C", "SODIUM", "POTASSIUM", "ACIDE URIQUE",
+         "GAMMA-GT", "ALAT (TGP)", "Vitamine B12", "Folates sériques", "Sélénium"]
+NOISE = ["Édition : 12/03/2024", "Laboratoire SYNLAB Paris", "Dossier n° 2403120045",
+         "Page 2 / 6", "BIOCHIMIE SANGUINE", "Interprétation : voir commentaire",
+         "Validé par Dr Martin", "Accéder à vos résultats en ligne", "Chimiluminescence (Siemens)",
+         "Prélèvement du 12/03/2024 à 08h15", "Renseignements cliniques", "ok"]
+
+
+def synthetic_lines(n: int, seed: int = 0) -> List[str]:
+    """Lignes au format des comptes rendus : 3 formats, bruit, lignes SIEMENS, texte libre."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        name = rnd.choice(NAMES)
+        v = f"{rnd.uniform(0.1, 300):.2f}".replace(".", rnd.choice([".", ","]))
+        lo = round(rnd.uniform(0.1, 50), 2)
+        hi = round(lo + rnd.uniform(1, 100), 2)
+        unit = rnd.choice(["g/L", "mg/dL", "mmol/L", "µmol/L", "UI/L", "%", "ng/mL"])
+        r = rnd.random()
+        if r < 0.25:
+            out.append(f"{name.upper()} {v} {unit} ({lo} - {hi})")
+        elif r < 0.45:
+            out.append(f"{name.upper()} {v} {unit} {lo} - {hi}")
+        elif r < 0.65:
+            out.append(f"{rnd.choice(['', '> '])}{name} {rnd.choice(['', '+', '-'])}{v} {lo} - {hi} {unit}")
+        elif r < 0.7:
+            out.append(f"SIEMENS ATELLICA {v} {unit} ({lo} - {hi})")
+        elif r < 0.75:
+            out.append(f"{name.upper()} < {v} {unit} (< {hi})")
+        elif r < 0.9:
+            out.append(rnd.choice(NOISE))
+        else:
+            out.append(f"Résultat contrôlé sur un second prélèvement le {rnd.randint(1, 28)}/03")
+    return out
+
+
+def pdf_lines(paths: List[str]) -> Dict[str, List[str]]:
+    """Lignes non vides de chaque PDF (lues une fois, comme extract_synlab_biology)."""
+    out = {}
+    for p in paths:
+        files = [p] if not os.path.isdir(p) else [
+            os.path.join(root, f) for root, _, fs in os.walk(p) for f in sorted(fs) if f.lower().endswith(".pdf")
+        ]
+        for f in files:
+            text = extractors._read_pdf_text(f)
+            out[f] = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Mesures
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _best_of(fn, lines: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_corpus(label: str, lines: List[str], repeat: int) -> Dict[str, Any]:
+    legacy = legacy_parse_synlab_lines(lines)
+    compiled = extractors._parse_synlab_lines(lines)
+    t_legacy = _best_of(legacy_parse_synlab_lines, lines, repeat)
+    t_compiled = _best_of(extractors._parse_synlab_lines, lines, repeat)
+    us = lambda s: round(s * 1e6 / max(len(lines), 1), 3)
+    return {
+        "corpus":            label,
+        "lines":             len(lines),
+        "biomarkers":        len(compiled),
+        "identical":         legacy == compiled,
+        "legacy_us_per_line":   us(t_legacy),
+        "compiled_us_per_line": us(t_compiled),
+        "speedup":           round(t_legacy / t_compiled, 2) if t_compiled else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark du parsing des lignes Synlab/Unilabs")
+    ap.add_argument("paths", nargs="*", help="comptes rendus PDF (fichiers ou dossiers)")
+    ap.add_argument("--synthetic", type=int, default=None,
+                    help="nombre de lignes synthétiques (défaut : 20000 sans PDF, 0 sinon)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", dest="json_path", help="écrit le rapport JSON dans ce fichier")
+    args = ap.parse_args(argv)
+
+    corpora = pdf_lines(args.paths)
+    n_synth = args.synthetic if args.synthetic is not None else (0 if corpora else 20000)
+    if n_synth:
+        corpora[f"synthetic:{n_synth}"] = synthetic_lines(n_synth, args.seed)
+    if len(corpora) > 1:
+        corpora["total"] = [ln for lines in list(corpora.values()) for ln in lines]
+
+    report = [bench_corpus(label, lines, args.repeat) for label, lines in corpora.items()]
+    cols = ["lines", "biomarkers", "identical", "legacy_us_per_line", "compiled_us_per_line", "speedup"]
+    print(f"{'':40s}" + "".join(f"{c:>22s}" for c in cols))
+    for r in report:
+        print(f"{os.path.basename(r['corpus'])[:40]:40s}" + "".join(f"{str(r[c]):>22s}" for c in cols))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if all(r["identical"] for r in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+ALGO-LIFE - Benchmark du moteur de règles sur patients synthétiques
+
+Patients générés à partir des biomarqueurs du classeur (feuilles bio, normes H/F compilées)
+et de BIOMARQUEURS_LIBRARY (app.py, lu par ast sans lancer Streamlit) : valeurs réparties
+autour des normes (dans / sous / au-dessus), libellés de labo variés, dicts microbiote au
+format GutMAP (bacteria_individual, bacteria_groups, stool_biomarkers).
+
+Rapporte, pour generate_recommendations et generate_consolidated_recommendations :
+latence par patient (p50 / p90 / p95 / p99 / max), débit, pic mémoire (tracemalloc).
+Régime établi : chauffe sur une autre cohorte (seed + 1), les patients mesurés ne sont
+jamais vus avant la mesure. Passe à froid : moteur neuf, mémos de normalisation vidés.
+
+    python benchmark_rules.py                      # 500 patients, classeur data/
+    python benchmark_rules.py -n 2000 --json out.json
+    python benchmark_rules.py --check-stream       # temps d'étape vs consommateur lent
+"""
+from __future__ import annotations
+import argparse
+import ast
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from normalization import clear_normalization_cache
+from rules_engine import RulesEngine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULES = os.path.join(BASE_DIR, "data", "Bases_regles_Synlab.xlsx")
+DEFAULT_APP   = os.path.join(BASE_DIR, "app.py")
+
+STOOL_MARKERS = [
+    ("Calprotectine", "µg/g", "< 50",   (5, 400)),
+    ("sIgA",          "µg/ml", "510-2040", (100, 4000)),
+    ("Histamine",     "ng/ml", "< 600",  (50, 2000)),
+    ("Zonuline",      "ng/ml", "< 107",  (10, 300)),
+    ("Elastase",      "µg/g", "> 200",   (50, 800)),
+]
+GROUP_RESULTS = ["Expected", "Expected", "Expected", "Slightly deviating high",
+                 "Slightly deviating low", "Deviating high", "Deviating low"]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Génération des patients
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_library(app_path: str = DEFAULT_APP) -> List[str]:
+    """Noms de BIOMARQUEURS_LIBRARY, extraits de app.py sans l'importer."""
+    try:
+        with open(app_path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "BIOMARQUEURS_LIBRARY" for t in node.targets
+        ):
+            lib = ast.literal_eval(node.value)
+            return [n for names in lib.values() for n in names]
+    return []
+
+
+def _value_around(rnd: random.Random, low: Optional[float], high: Optional[float]) -> float:
+    """~60 % dans la norme, ~20 % en dessous, ~20 % au-dessus (bornes manquantes tolérées)."""
+    if low is None and high is None:
+        return round(math.exp(rnd.uniform(math.log(0.05), math.log(500))), 3)
+    if low is None:
+        low = 0.0
+    if high is None:
+        high = low * 2 if low > 0 else 1.0
+    span = max(high - low, abs(high) * 0.1, 1e-3)
+    r = rnd.random()
+    if r < 0.6:
+        v = rnd.uniform(low, high)
+    elif r < 0.8:
+        v = low - rnd.uniform(0.05, 0.8) * span
+    else:
+        v = high + rnd.uniform(0.05, 1.5) * span
+    return round(max(v, 0.0), 3)
+
+
+def _lab_label(rnd: random.Random, name: str) -> str:
+    """Libellé tel qu'il sort d'un compte rendu (casse, suffixe, abréviation)."""
+    r = rnd.random()
+    if r < 0.7:
+        return name
+    if r < 0.8:
+        return name.upper()
+    if r < 0.9:
+        return f"{name} sérique"
+    return name.split(" ")[0]
+
+
+class PatientFactory:
+    def __init__(self, engine: RulesEngine, library: List[str], seed: int = 0):
+        self.rnd = random.Random(seed)
+        # nom -> normes (H, F) compilées, première feuille qui le définit
+        self.norms: Dict[str, Dict[str, Tuple[Optional[float], Optional[float]]]] = {}
+        for rules in engine._bio_rules.values():
+            for rule in rules:
+                self.norms.setdefault(rule.name, {sk: n[1:] for sk, n in rule.norms.items()})
+        self.library = [n for n in library if n not in self.norms]
+        df = engine._df_micro
+        self.bacteria = [str(b) for b in df["Marqueur_bacterien"].unique()] if df is not None else []
+        self.groups = (
+            [str(c) for c in df["Categorie"].dropna().unique()]
+            if df is not None and "Categorie" in df.columns else []
+        )
+
+    def bio(self, sex_key: str) -> Dict[str, float]:
+        rnd = self.rnd
+        names = list(self.norms)
+        out: Dict[str, float] = {}
+        for name in rnd.sample(names, min(len(names), rnd.randint(25, 90))):
+            low, high = self.norms[name][sex_key]
+            out[_lab_label(rnd, name)] = _value_around(rnd, low, high)
+        for name in rnd.sample(self.library, min(len(self.library), rnd.randint(0, 15))):
+            out.setdefault(name, _value_around(rnd, None, None))
+        return out
+
+    def microbiome(self) -> Optional[Dict[str, Any]]:
+        rnd = self.rnd
+        if not self.bacteria or rnd.random() < 0.4:
+            return None
+        levels = [0] * 10 + [1, 1, -1, -1, 2, -2, 3, -3]
+        individual = [
+            {"id": f"{i + 1:03d}", "name": name, "category": "", "group": "",
+             "abundance_level": rnd.choice(levels)}
+            for i, name in enumerate(rnd.sample(self.bacteria, min(48, len(self.bacteria))))
+        ]
+        groups = [
+            {"category": g, "name": g, "abundance": rnd.choice(GROUP_RESULTS),
+             "result": rnd.choice(GROUP_RESULTS)}
+            for g in self.groups[:12]
+        ]
+        stool = {}
+        for name, unit, ref, (lo, hi) in rnd.sample(STOOL_MARKERS, rnd.randint(0, len(STOOL_MARKERS))):
+            v = round(rnd.uniform(lo, hi), 1)
+            status = rnd.choice(["Normal", "Normal", "Élevé", "Bas"])
+            stool[name] = {"value": v, "unit": unit, "reference": ref, "status": status}
+        return {
+            "dysbiosis_index":     rnd.randint(1, 5),
+            "bacteria_individual": individual,
+            "bacteria_groups":     groups,
+            "stool_biomarkers":    stool,
+        }
+
+    def patients(self, n: int) -> List[Dict[str, Any]]:
+        out = []
+        for _ in range(n):
+            sex = self.rnd.choice(["H", "F"])
+            out.append({
+                "bio_data":        self.bio(sex),
+                "microbiome_data": self.microbiome(),
+                "sex":             sex,
+            })
+        return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Mesures
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _call(engine: RulesEngine, target: str, p: Dict[str, Any]):
+    if target == "generate_recommendations":
+        return engine.generate_recommendations(
+            bio_data=p["bio_data"], microbiome_data=p["microbiome_data"], sex=p["sex"]
+        )
+    return engine.generate_consolidated_recommendations(
+        bio_data=p["bio_data"], microbiome_data=p["microbiome_data"], patient_info={"sex": p["sex"]}
+    )
+
+
+def _latencies(engine: RulesEngine, target: str, patients: List[Dict[str, Any]]) -> Tuple[List[float], int, float]:
+    """(latences triées, nombre de recos, durée totale) d'une passe sur la cohorte."""
+    lat = []
+    n_recs = 0
+    t_all = time.perf_counter()
+    for p in patients:
+        t0 = time.perf_counter()
+        res = _call(engine, target, p)
+        lat.append(time.perf_counter() - t0)
+        n_recs += res["total"]
+    elapsed = time.perf_counter() - t_all
+    lat.sort()
+    return lat, n_recs, elapsed
+
+
+def bench(
+    engine: RulesEngine,
+    target: str,
+    patients: List[Dict[str, Any]],
+    warmup: List[Dict[str, Any]],
+    cold_engine: Optional[RulesEngine] = None,
+) -> Dict[str, Any]:
+    ms = lambda s: round(s * 1000, 3)
+    cold: Dict[str, float] = {}
+    if cold_engine is not None:
+        # Passe à froid : premier passage des libellés (mémos de matching / normalisation vides)
+        clear_normalization_cache()
+        c_lat, _, c_elapsed = _latencies(cold_engine, target, patients)
+        cold = {
+            "cold_p50_ms":  ms(_percentile(c_lat, 0.50)),
+            "cold_p95_ms":  ms(_percentile(c_lat, 0.95)),
+            "cold_max_ms":  ms(c_lat[-1]) if c_lat else 0.0,
+            "cold_mean_ms": ms(c_elapsed / len(patients)) if patients else 0.0,
+        }
+
+    # Chauffe sur une cohorte distincte : régime établi sans rejouer les patients mesurés
+    for p in warmup:
+        _call(engine, target, p)
+
+    lat, n_recs, elapsed = _latencies(engine, target, patients)
+
+    # Mémoire : passe séparée (tracemalloc ralentit fortement l'évaluation)
+    tracemalloc.start()
+    kept = [_call(engine, target, p) for p in patients]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return {
+        "patients":          len(patients),
+        "recommendations":   n_recs,
+        "p50_ms":            ms(_percentile(lat, 0.50)),
+        "p90_ms":            ms(_percentile(lat, 0.90)),
+        "p95_ms":            ms(_percentile(lat, 0.95)),
+        "p99_ms":            ms(_percentile(lat, 0.99)),
+        "max_ms":            ms(lat[-1]) if lat else 0.0,
+        "mean_ms":           ms(elapsed / len(patients)) if patients else 0.0,
+        "throughput_per_s":  round(len(patients) / elapsed, 1) if elapsed else 0.0,
+        "peak_mem_mb":       round(peak / 2**20, 2),
+        "peak_mem_kb_per_patient": round(peak / 1024 / max(len(patients), 1), 2),
+        **cold,
+    }
+
+
+def check_stream_timing(engine: RulesEngine, patients: List[Dict[str, Any]],
+                        delay: float = 0.002) -> Dict[str, Any]:
+    """
+    Consommateur lent sur stream_recommendations : pause de `delay` s après chaque reco.
+    Les étapes de la trace ne doivent compter que le temps du moteur, donc rester sous le
+    temps d'une évaluation directe du même patient (marge x2 + 5 ms contre le bruit).
+    """
+    failures = []
+    for i, p in enumerate(patients):
+        t0 = time.perf_counter()
+        _call(engine, "generate_recommendations", p)
+        direct = time.perf_counter() - t0
+
+        stream = engine.stream_recommendations(p["bio_data"], p["microbiome_data"], p["sex"])
+        n = 0
+        for _ in stream:
+            time.sleep(delay)
+            n += 1
+        staged = sum(st["seconds"] for st in stream.trace.stages)
+        if n and staged > 2 * direct + 0.005:
+            failures.append({"patient": i, "recs": n, "slept_ms": round(n * delay * 1000, 1),
+                             "stages_ms": round(staged * 1000, 3), "direct_ms": round(direct * 1000, 3)})
+    return {"patients": len(patients), "delay_ms": delay * 1000, "failures": failures}
+
+
+def bench_load(rules_path: str) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    RulesEngine(rules_path, use_cache=False)
+    cold = time.perf_counter() - t0
+    RulesEngine(rules_path)            # remplit le cache si besoin
+    t0 = time.perf_counter()
+    RulesEngine(rules_path)
+    warm = time.perf_counter() - t0
+    return {"cold_load_ms": round(cold * 1000, 1), "cached_load_ms": round(warm * 1000, 1)}
+
+
+def run(rules_path: str, n: int, seed: int, app_path: str = DEFAULT_APP) -> Dict[str, Any]:
+    engine = RulesEngine(rules_path)
+    library = load_library(app_path)
+    patients = PatientFactory(engine, library, seed=seed).patients(n)
+    warmup   = PatientFactory(engine, library, seed=seed + 1).patients(n)
+    report = {
+        "rulebook_version": engine.rulebook_version,
+        "seed":             seed,
+        "load":             bench_load(rules_path),
+    }
+    for target in ("generate_recommendations", "generate_consolidated_recommendations"):
+        report[target] = bench(engine, target, patients, warmup, cold_engine=RulesEngine(rules_path))
+    return report
+
+
+def _print_report(report: Dict[str, Any]):
+    print(f"Classeur {report['rulebook_version']} | seed {report['seed']}")
+    print(f"Chargement : {report['load']['cold_load_ms']} ms (Excel) / "
+          f"{report['load']['cached_load_ms']} ms (cache)")
+    cols = ["p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms", "throughput_per_s", "peak_mem_mb",
+            "cold_p50_ms", "cold_p95_ms"]
+    print(f"{'':40s}" + "".join(f"{c:>18s}" for c in cols))
+    for target in ("generate_recommendations", "generate_consolidated_recommendations"):
+        r = report[target]
+        print(f"{target:40s}" + "".join(f"{r.get(c, '-'):>18}" for c in cols))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark RulesEngine sur patients synthétiques")
+    ap.add_argument("--rules", default=DEFAULT_RULES, help="classeur de règles (.xlsx)")
+    ap.add_argument("-n", "--patients", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", dest="json_path", help="écrit le rapport JSON dans ce fichier")
+    ap.add_argument("--check-stream", action="store_true",
+                    help="vérifie seulement que les temps d'étape excluent le consommateur")
+    args = ap.parse_args(argv)
+
+    if args.check_stream:
+        engine = RulesEngine(args.rules)
+        patients = PatientFactory(engine, load_library(), seed=args.seed).patients(min(args.patients, 20))
+        res = check_stream_timing(engine, patients)
+        for f in res["failures"]:
+            print(f"patient {f['patient']} : {f['stages_ms']} ms d'étapes pour {f['direct_ms']} ms "
+                  f"en direct ({f['recs']} recos, {f['slept_ms']} ms de pause)")
+        print(f"{res['patients']} patients, consommateur à {res['delay_ms']} ms/reco : "
+              f"{len(res['failures'])} écart(s)")
+        return 1 if res["failures"] else 0
+
+    report = run(args.rules, args.patients, args.seed)
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
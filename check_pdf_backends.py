@@ -0,0 +1,302 @@
+"""
+ALGO-LIFE - Parité des backends PDF (PyMuPDF vs pdfplumber)
+
+Pour chaque compte rendu : texte ligne à ligne de chaque page, points d'abondance
+(_extract_dots_from_pdf_page sur les graphiques de page), format détecté et sorties de
+extract_synlab_biology / extract_lims_biology / extract_idk_microbiome, comparés entre
+les deux backends. Le cache d'extraction est désactivé pendant la vérification.
+Code retour 1 si un écart est trouvé.
+
+Sans argument, la vérification porte sur les PDF de data/pdf_fixtures (générés par
+--make-fixtures avec reportlab) : colonnes posées séparément, mots à 2 pt (« TSH2.5 »
+pour pdfplumber), exposants, lignes à moins de 3 pt, flèches ▲▼, ligatures, texte
+tourné, points d'abondance en cercles et en carrés, police symbolique sans ToUnicode
+(PDF refusé par PyMuPDF : le repli sur pdfplumber est attendu).
+
+    python check_pdf_backends.py                           # PDF de référence du dépôt
+    python check_pdf_backends.py rapports/                 # dossiers parcourus (*.pdf)
+    python check_pdf_backends.py a.pdf b.pdf -v --json parity.json
+    python check_pdf_backends.py --make-fixtures           # régénère data/pdf_fixtures
+"""
+from __future__ import annotations
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+os.environ["ALGOLIFE_EXTRACT_CACHE"] = "0"
+
+import extractors  # noqa: E402
+from extractors import PdfDocument  # noqa: E402
+
+BACKENDS = ("pdfplumber", "pymupdf")
+EXTRACTORS = ("detect_pdf_lab_format", "extract_synlab_biology",
+              "extract_lims_biology", "extract_idk_microbiome")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BASE_DIR, "data", "pdf_fixtures")
+# Police TTF embarquée pour ▲▼ et les ligatures (régénération des PDF de référence seulement)
+FIXTURE_FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF de référence
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _fixture_synlab(c):
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 800, "SYNLAB Laboratoire Paris - Edition : 12/03/2024")
+    c.drawString(40, 785, "Page 1 / 2")
+    c.drawString(40, 770, "BIOCHIMIE SANGUINE")
+    y = 750
+    for ln in ("GLUCOSE 0.95 g/L (0.70 - 1.10)", "CHOLESTEROL TOTAL 2.10 g/L (1.50 - 2.00)",
+               "FERRITINE 45 ng/mL 30 - 400", "Vitamine B12 350 197 - 771 pg/mL",
+               "> HDL Cholesterol 0.55 0.40 - 0.90 g/L", "SIEMENS ATELLICA 1.2 g/L (0.5 - 2.0)",
+               "CRP ULTRASENSIBLE < 0.6 mg/L (< 5.0)", "Interprétation : voir commentaire"):
+        c.drawString(40, y, ln)
+        y -= 16
+    # Mots posés séparément : 2 pt -> un seul mot pour pdfplumber (x_tolerance = 3), 4 pt -> deux
+    w = c.stringWidth("TSH", "Helvetica", 10)
+    c.drawString(40, y, "TSH")
+    c.drawString(40 + w + 2, y, "2.5")
+    c.drawString(120, y, "mUI/L (0.4 - 4.0)")
+    y -= 16
+    c.drawString(40, y, "TSH")
+    c.drawString(40 + w + 4, y, "2.5")
+    c.drawString(120, y, "mUI/L (0.4 - 4.0)")
+    y -= 16
+    # Écart de 3 pt exactement, puis bord de colonne chevauchant
+    w = c.stringWidth("ZINC", "Helvetica", 10)
+    c.drawString(40, y, "ZINC")
+    c.drawString(40 + w + 3, y, "12.1 µmol/L (11 - 18)")
+    y -= 16
+    c.drawString(40, y, "MAGNESIUM")
+    c.drawString(40 + c.stringWidth("MAGNESIUM", "Helvetica", 10) - 1, y, "0.85 mmol/L (0.75 - 1.00)")
+    c.showPage()
+
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 800, "SYNLAB Laboratoire Paris")
+    c.drawString(40, 785, "Page 2 / 2")
+    y = 760
+    rows = (("LEUCOCYTES", "6.2", "10^9/L", "(4.0 - 10.0)"), ("HEMOGLOBINE", "14.1", "g/dL", "(13.0 - 17.0)"),
+            ("PLAQUETTES", "250", "10^9/L", "(150 - 400)"), ("SODIUM", "141", "mmol/L", "(136 - 145)"),
+            ("POTASSIUM", "4.1", "mmol/L", "(3.5 - 5.1)"), ("CREATININE", "82", "µmol/L", "(59 - 104)"))
+    # Tableau : colonnes posées séparément, base légèrement décalée (< 3 pt), unités en
+    # petit corps surélevé, polices différentes dans la ligne
+    for k, (name, value, unit, ref) in enumerate(rows):
+        c.setFont("Helvetica-Bold" if k % 2 else "Helvetica", 10)
+        c.drawString(40, y, name)
+        c.setFont("Times-Roman" if k % 3 == 1 else "Helvetica", 10)
+        c.drawString(260, y + (1.5 if k % 2 else 0), value)
+        c.setFont("Helvetica", 7 if k % 3 == 0 else 10)
+        c.drawString(300, y + (2 if k % 3 == 0 else 0), unit)
+        c.setFont("Courier" if k % 3 == 2 else "Helvetica", 10)
+        c.drawString(360, y - (2.5 if k % 2 else 0), ref)
+        y -= 18
+    # Lignes à 2.9 pt puis 6 pt : regroupement des hauts (y_tolerance = 3)
+    c.setFont("Helvetica", 10)
+    c.drawString(40, y, "Commentaire a")
+    c.drawString(160, y - 2.9, "b")
+    c.drawString(40, y - 6, "c")
+    c.showPage()
+
+
+def _fixture_lims(c):
+    c.setFont("DejaVu", 10)
+    c.drawString(40, 800, "LIMS Site LOUVAIN mbnext")
+    c.drawString(40, 785, "Résultats Unités Valeurs de référence")
+    y = 760
+    for ln in ("Glucose ▲ 1.32 g/L 0.70 - 1.10", "Ferritine ▼ 12 ng/mL 30 - 400",
+               "Vitamine D 32 ng/mL 30 - 100", "CRP 0.4 mg/L < 5.0", "Hémoglobine 14.2 g/dL 13.0 - 17.0",
+               "Coefﬁcient de saturation 28 % 20 - 40", "Recherche de ﬂore NORMAL"):
+        c.drawString(40, y, ln)
+        y -= 16
+    # Flèche posée dans sa propre colonne, à 2 pt de la valeur
+    c.drawString(40, y, "Magnésium")
+    c.drawString(200, y, "▲")
+    c.drawString(200 + c.stringWidth("▲", "DejaVu", 10) + 2, y, "1.12 mmol/L 0.75 - 1.00")
+    y -= 16
+    # Texte tourné (marges) : quart de tour dans les deux sens et demi-tour
+    for angle, x, yy in ((90, 20, 300), (270, 580, 600), (180, 400, 60)):
+        c.saveState()
+        c.translate(x, yy)
+        c.rotate(angle)
+        c.drawString(0, 0, "Document validé électroniquement 2024")
+        c.restoreState()
+    c.showPage()
+
+
+def _fixture_idk(c):
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 800, "IDK GutMAP Result: The bacterial diversity is as expected")
+    c.drawString(40, 780, "Dysbiosis Index: Mildly dysbiotic")
+    c.showPage()
+    k = 1
+    # Points d'abondance : cercles (courbes de Bézier) page 2, carrés (rectangles) page 3
+    for circles in (True, False):
+        c.setFont("Helvetica", 10)
+        c.drawString(40, 800, "Category A. Bacteria")
+        c.drawString(40, 790, "A1. Prominent gut microbes")
+        y = 770
+        for level in (-3, -1, 0, 0, 1, 2, 3, -2):
+            c.drawString(40, y, f"{k:03d} Bacteroides species {chr(64 + k)}")
+            if circles:
+                c.circle(300 + level * 20, y + 3, 3, fill=1)
+            else:
+                c.rect(297 + level * 20, y, 6, 6, fill=1)
+            k += 1
+            y -= 24
+        c.showPage()
+
+
+def _fixture_zapf(c):
+    # ZapfDingbats non embarquée, sans ToUnicode : « s » lu tel quel par pdfminer, ▲ par MuPDF
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 800, "LIMS Site LOUVAIN mbnext")
+    t = c.beginText(40, 780)
+    t.textOut("Vitamine D ")
+    t.setFont("ZapfDingbats", 10)
+    t.textOut("s")
+    t.setFont("Helvetica", 10)
+    t.textOut(" 12 ng/mL 30 - 100")
+    c.drawText(t)
+    c.showPage()
+
+
+FIXTURES = {
+    "synlab_colonnes.pdf": _fixture_synlab,
+    "lims_fleches.pdf":    _fixture_lims,
+    "idk_points.pdf":      _fixture_idk,
+    "zapf_repli.pdf":      _fixture_zapf,
+}
+# PDF que PyMuPDF doit refuser (repli pdfplumber attendu)
+FIXTURES_FALLBACK = {"zapf_repli.pdf"}
+
+
+def make_fixtures(dest: str = FIXTURES_DIR) -> List[str]:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont("DejaVu", FIXTURE_FONT))
+    os.makedirs(dest, exist_ok=True)
+    out = []
+    for name, draw in FIXTURES.items():
+        path = os.path.join(dest, name)
+        # invariant : pas de date ni d'identifiant aléatoire, fichiers reproductibles
+        c = canvas.Canvas(path, pagesize=A4, invariant=1)
+        draw(c)
+        c.save()
+        out.append(path)
+    return out
+
+
+def find_pdfs(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                out.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".pdf"))
+        else:
+            out.append(p)
+    return out
+
+
+def snapshot(path: str, backend: str) -> Dict[str, Any]:
+    """Tout ce que les extracteurs voient d'un PDF avec un backend donné."""
+    t0 = time.perf_counter()
+    with PdfDocument(path, workers=0, backend=backend) as doc:
+        pages = [doc.page_text(i).splitlines() for i in range(doc.page_count)]
+        dots = [extractors._extract_dots_from_pdf_page(doc.page_graphics(i)) for i in range(doc.page_count)]
+        read_s = time.perf_counter() - t0
+        outputs = {}
+        for name in EXTRACTORS:
+            try:
+                outputs[name] = getattr(extractors, name)(doc)
+            except Exception as e:
+                outputs[name] = f"{type(e).__name__}: {e}"
+        used = doc.backend
+    return {"backend": used, "pages": pages, "dots": dots, "outputs": outputs,
+            "read_ms": round(read_s * 1000, 1)}
+
+
+def _round_dots(dots: List[List[Dict]]) -> List[List[tuple]]:
+    # Coordonnées flottantes : arrondies au dixième de point
+    return [[(round(d["x"], 1), round(d["y"], 1), d["type"], d.get("abundance_level")) for d in page]
+            for page in dots]
+
+
+def compare(path: str, verbose: bool = False) -> Dict[str, Any]:
+    ref, new = (snapshot(path, b) for b in BACKENDS)
+    issues: List[str] = []
+    try:
+        extractors._import_pymupdf()
+    except ImportError:
+        issues.append("PyMuPDF indisponible")
+    if len(ref["pages"]) != len(new["pages"]):
+        issues.append(f"nombre de pages {len(ref['pages'])} != {len(new['pages'])}")
+    for i, (a, b) in enumerate(zip(ref["pages"], new["pages"])):
+        if a != b:
+            issues.append(f"page {i + 1} : texte différent")
+            if verbose:
+                issues.extend("    " + d for d in difflib.unified_diff(a, b, "pdfplumber", "pymupdf", lineterm="", n=0))
+    if _round_dots(ref["dots"]) != _round_dots(new["dots"]):
+        issues.append("points d'abondance différents")
+    for name in EXTRACTORS:
+        if ref["outputs"][name] != new["outputs"][name]:
+            issues.append(f"{name} : sortie différente")
+    return {
+        "path":           path,
+        "pages":          len(ref["pages"]),
+        "ok":             not issues,
+        "issues":         issues,
+        "fallback":       new["backend"] != "pymupdf",
+        "pdfplumber_ms":  ref["read_ms"],
+        "pymupdf_ms":     new["read_ms"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Parité des backends PDF (PyMuPDF vs pdfplumber)")
+    ap.add_argument("paths", nargs="*", help="fichiers PDF ou dossiers (défaut : data/pdf_fixtures)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="affiche les lignes qui diffèrent")
+    ap.add_argument("--json", dest="json_path", help="écrit le rapport JSON dans ce fichier")
+    ap.add_argument("--make-fixtures", action="store_true", help="régénère data/pdf_fixtures (reportlab)")
+    args = ap.parse_args(argv)
+
+    if args.make_fixtures:
+        for path in make_fixtures():
+            print(f"écrit {path}")
+    fixtures = not args.paths
+    pdfs = find_pdfs(args.paths or [FIXTURES_DIR])
+    if not pdfs:
+        print("aucun PDF trouvé")
+        return 2
+    report = [compare(p, args.verbose) for p in pdfs]
+    if fixtures:
+        # Le repli sur pdfplumber rendrait la comparaison vide : il doit être celui attendu
+        for r in report:
+            expected = os.path.basename(r["path"]) in FIXTURES_FALLBACK
+            if r["fallback"] != expected:
+                r["ok"] = False
+                r["issues"].append("repli pdfplumber " + ("absent" if expected else "inattendu"))
+    for r in report:
+        status = "OK  " if r["ok"] else "DIFF"
+        print(f"{status} {r['path']} ({r['pages']} p.) lecture pdfplumber {r['pdfplumber_ms']} ms"
+              f" / pymupdf {r['pymupdf_ms']} ms" + (" (repli pdfplumber)" if r["fallback"] else ""))
+        for issue in r["issues"]:
+            print(f"     {issue}")
+    failed = sum(not r["ok"] for r in report)
+    print(f"{len(report) - failed}/{len(report)} rapports identiques")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+ALGO-LIFE - Cache disque des extractions PDF
+
+Un même compte rendu est souvent re-téléversé (ré-analyse, second praticien, fiche
+patient corrigée) : le résultat d'un extracteur est gardé sur disque, clé = sha256 du
+contenu du fichier + nom et version de l'extracteur + arguments. Un fichier pickle par
+entrée (écriture atomique), durée de conservation bornée (date d'écriture = mtime),
+éviction LRU (dernier accès = atime) au-delà de max_bytes, statistiques hits / misses /
+écritures / évictions / expirations.
+
+DONNÉES PATIENT : les entrées contiennent les résultats de laboratoire extraits, en clair
+(pickle non chiffré). Le cache est donc désactivé par défaut ; ne l'activer que sur un
+dossier dont l'accès et la sauvegarde respectent la politique de données de santé du site.
+
+    ALGOLIFE_EXTRACT_CACHE=1          active le cache (défaut : désactivé)
+    ALGOLIFE_EXTRACT_CACHE_DIR=...    dossier (défaut : data/.extract_cache)
+    ALGOLIFE_EXTRACT_CACHE_MB=256     taille maximale
+    ALGOLIFE_EXTRACT_CACHE_TTL_H=24   conservation maximale d'une entrée, en heures
+"""
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIR = os.path.join(BASE_DIR, "data", ".extract_cache")
+DEFAULT_MAX_MB = 256
+DEFAULT_TTL_H = 24
+_SUFFIX = ".pkl"
+_CHUNK = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """Cache clé -> objet picklable, un fichier par entrée, borné en taille (LRU) et en durée."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir or os.getenv("ALGOLIFE_EXTRACT_CACHE_DIR") or DEFAULT_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv("ALGOLIFE_EXTRACT_CACHE_MB", DEFAULT_MAX_MB)) * 2**20
+        )
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else (
+            float(os.getenv("ALGOLIFE_EXTRACT_CACHE_TTL_H", DEFAULT_TTL_H)) * 3600
+        )
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0, "errors": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _expired(self, written: float, now: float) -> bool:
+        return now - written > self.ttl_seconds
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        path = self._path(key)
+        try:
+            if self._expired(os.stat(path).st_mtime, time.time()):
+                if self._unlink(path):
+                    self._count("expired")
+                self._count("misses")
+                return False, None
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self._count("misses")
+            return False, None
+        except Exception:
+            # Entrée corrompue / format obsolète : supprimée, relecture du PDF
+            self._count("errors")
+            self._count("misses")
+            self._unlink(path)
+            return False, None
+        try:
+            # atime = dernier accès (LRU), mtime = écriture (durée de conservation) inchangé
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+        self._count("hits")
+        return True, value
+
+    def put(self, key: str, value: Any):
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp, 0o600)   # données patient : lisibles par le seul compte du service
+            os.replace(tmp, self._path(key))
+        except Exception:
+            # Cache non inscriptible : l'extraction reste valable, simplement pas gardée
+            if tmp is not None:
+                self._unlink(tmp)
+            self._count("errors")
+            return
+        self._count("writes")
+        self._evict()
+
+    def _entries(self):
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.endswith(_SUFFIX):
+                        try:
+                            st = e.stat()
+                        except FileNotFoundError:
+                            continue
+                        yield e.path, st.st_size, st.st_atime, st.st_mtime
+        except FileNotFoundError:
+            return
+
+    def _evict(self):
+        """Supprime les entrées expirées, puis les moins récemment lues au-delà de max_bytes."""
+        now = time.time()
+        entries = []
+        for path, size, atime, mtime in self._entries():
+            if self._expired(mtime, now):
+                if self._unlink(path):
+                    self._count("expired")
+            else:
+                entries.append((path, size, atime))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort(key=lambda e: e[2])
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if self._unlink(path):
+                self._count("evictions")
+            total -= size
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        for path, *_ in list(self._entries()):
+            self._unlink(path)
+
+    def purge_expired(self):
+        """Applique la durée de conservation sans attendre la prochaine écriture."""
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du process + occupation actuelle du dossier (JSON-sérialisable)."""
+        entries = list(self._entries())
+        with self._lock:
+            out = dict(self._stats)
+        lookups = out["hits"] + out["misses"]
+        out.update({
+            "hit_rate":    round(out["hits"] / lookups, 3) if lookups else 0.0,
+            "entries":     len(entries),
+            "size_bytes":  sum(e[1] for e in entries),
+            "max_bytes":   self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "cache_dir":   self.cache_dir,
+        })
+        return out
+
+
+_default: Optional[ExtractionCache] = None
+_default_lock = threading.Lock()
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Cache partagé du process ; None sauf activation explicite (ALGOLIFE_EXTRACT_CACHE=1)."""
+    global _default
+    if os.getenv("ALGOLIFE_EXTRACT_CACHE", "0") != "1":
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = ExtractionCache()
+        return _default
@@ -9,16 +9,27 @@ ALGO-LIFE - Extractors v18.1 FINAL WITH EXCEL MICROBIOME SUPPORT
 ✅ Références par défaut pour biomarqueurs courants
 ✅ Extraction robuste des 48 bactéries + groupes
 ✅ Détection graphique des positions d'abondance
+✅ PdfDocument : un PDF parsé une fois, partagé par détection de format et extracteurs
+✅ Extraction du texte page-parallèle optionnelle (ALGOLIFE_PDF_WORKERS / workers=)
+✅ Backend PDF interchangeable : pdfplumber par défaut, PyMuPDF en option (ALGOLIFE_PDF_BACKEND)
+✅ Cache disque des extractions, opt-in (ALGOLIFE_EXTRACT_CACHE=1), cf. extraction_cache
 """
 
 from __future__ import annotations
+import functools
+import hashlib
+import inspect
+import itertools
 import os
 import re
 import sys
-import unicodedata
+import threading
 from typing import Dict, Any, List, Optional, Tuple
 import pandas as pd
 
+from extraction_cache import file_sha256, get_extraction_cache, make_key
+from normalization import normalize_lab_label
+
 try:
     import numpy as np
     NUMPY_AVAILABLE = True
@@ -84,28 +95,8 @@ DEFAULT_REFERENCES = {
 
 
 def normalize_biomarker_name(name):
-    """Normalise les noms de biomarqueurs"""
-    if name is None:
-        return ""
-    s = str(name).strip()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.upper()
-    s = s.replace(".", " ")
-    s = s.replace(",", " ")
-    s = s.replace("'", "'")
-    s = re.sub(r"[^A-Z0-9\s\-\+/]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    
-    replacements = {
-        "C P K": "CPK", "L D L": "LDL", "H D L": "HDL",
-        "V G M": "VGM", "T C M H": "TCMH", "C C M H": "CCMH",
-        "C R P": "CRP", "T S H": "TSH", "D F G": "DFG",
-        "G P T": "GPT", "G O T": "GOT"
-    }
-    for old, new in replacements.items():
-        s = s.replace(old, new)
-    return s
+    """Normalise les noms de biomarqueurs (mémoïsé, cf. normalization.py)"""
+    return normalize_lab_label(name)
 
 
 def _safe_float(x):
@@ -180,18 +171,564 @@ def determine_biomarker_status(value, reference, biomarker_name=None):
     return "Inconnu"
 
 
-def _read_pdf_text(pdf_path):
-    """Lit le texte complet d'un PDF"""
-    try:
+# ─────────────────────────────────────────────────────────────────────────────
+# Document PDF parsé une seule fois
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PageGraphics:
+    """Graphiques vectoriels d'une page (mêmes clés que pdfplumber : curves[pts], rects[x0..y1])."""
+
+    __slots__ = ("curves", "rects")
+
+    def __init__(self, curves=None, rects=None):
+        self.curves = curves or []
+        self.rects = rects or []
+
+
+# Backend d'extraction : "pdfplumber" (défaut, référence historique) ou "pymupdf" (rapide).
+# Les largeurs de caractères de MuPDF (police embarquée) s'écartent de /Widths de quelques
+# centièmes de point : un écart entre deux mots à la limite de LINE_X_TOLERANCE peut être
+# coupé autrement. PyMuPDF n'est à activer qu'après check_pdf_backends.py sur les comptes
+# rendus du site. PyMuPDF absent ou PDF qu'il refuse d'ouvrir -> pdfplumber.
+PDF_BACKEND = os.getenv("ALGOLIFE_PDF_BACKEND", "pdfplumber")
+# Regroupement des caractères en mots puis en lignes : mêmes tolérances que pdfplumber
+# (x : écart entre la fin d'un caractère et le début du suivant ; y : écart des hauts)
+LINE_X_TOLERANCE = 3
+LINE_Y_TOLERANCE = 3
+# Polices standard sans FontDescriptor : descendant des métriques AFM (en em), comme pdfminer
+_STANDARD_FONT_DESCENTS = {"Courier": -0.194, "CourierNew": -0.194, "Helvetica": -0.207,
+                           "Arial": -0.207, "Times": -0.217, "TimesNewRoman": -0.217}
+_LIGATURES = {"ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl", "ﬁ": "fi", "ﬂ": "fl", "ﬆ": "st", "ﬅ": "st"}
+
+
+def _open_source(source):
+    """Chemin / bytes / fichier -> argument accepté par les deux bibliothèques."""
+    if isinstance(source, (bytes, bytearray)):
+        import io
+        return io.BytesIO(source)
+    return source
+
+
+class _PdfplumberBackend:
+    name = "pdfplumber"
+
+    def __init__(self, source):
         import pdfplumber
-    except ImportError as e:
-        raise ImportError("pdfplumber manquant") from e
-    
-    chunks = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            chunks.append(page.extract_text() or "")
-    return "\n".join(chunks)
+        self._pdf = pdfplumber.open(source)
+
+    def page_count(self) -> int:
+        return len(self._pdf.pages)
+
+    def page_text(self, i: int) -> str:
+        return self._pdf.pages[i].extract_text() or ""
+
+    def page_words(self, i: int) -> List[Dict[str, Any]]:
+        return self._pdf.pages[i].extract_words()
+
+    def page_graphics(self, i: int) -> PageGraphics:
+        page = self._pdf.pages[i]
+        return PageGraphics(
+            curves=[{"pts": c["pts"]} for c in page.curves if "pts" in c],
+            rects=[{k: r[k] for k in ("x0", "y0", "x1", "y1") if k in r} for r in page.rects],
+        )
+
+    def close(self):
+        self._pdf.close()
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf   # PyMuPDF < 1.24
+    return pymupdf
+
+
+def _cluster_index(values, tolerance: float) -> Dict[float, int]:
+    """cluster_list de pdfplumber : valeurs distinctes triées, chaînées tant que l'écart au
+    précédent reste <= tolérance ; valeur -> numéro de groupe (croissant)."""
+    index: Dict[float, int] = {}
+    n, last = 0, None
+    for v in sorted(set(values)):
+        if last is not None and v > last + tolerance:
+            n += 1
+        index[v] = n
+        last = v
+    return index
+
+
+def _cluster_by(objs: List[Dict[str, Any]], key, tolerance: float) -> List[List[Dict[str, Any]]]:
+    """cluster_objects de pdfplumber : groupes par valeur croissante, ordre d'origine dedans."""
+    index = _cluster_index(map(key, objs), tolerance)
+    clusters: List[List[Dict[str, Any]]] = [[] for _ in range(max(index.values(), default=-1) + 1)]
+    for o in objs:
+        clusters[index[key(o)]].append(o)
+    return clusters
+
+
+def _begins_new_word(prev: Dict[str, Any], curr: Dict[str, Any]) -> bool:
+    # Texte droit : lecture gauche -> droite ; texte tourné : haut -> bas (défauts pdfplumber)
+    if curr["upright"]:
+        return (curr["x0"] < prev["x0"] or curr["x0"] > prev["x1"] + LINE_X_TOLERANCE
+                or abs(curr["top"] - prev["top"]) > LINE_Y_TOLERANCE)
+    return (curr["top"] < prev["top"] or curr["top"] > prev["bottom"] + LINE_Y_TOLERANCE
+            or abs(curr["x0"] - prev["x0"]) > LINE_X_TOLERANCE)
+
+
+def _merge_word(chars: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "text":    "".join(_LIGATURES.get(c["text"], c["text"]) for c in chars),
+        "x0":      min(c["x0"] for c in chars),
+        "x1":      max(c["x1"] for c in chars),
+        "top":     min(c["top"] for c in chars),
+        "bottom":  max(c["bottom"] for c in chars),
+        "upright": chars[0]["upright"],
+    }
+
+
+def _chars_to_words(chars: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """WordExtractor de pdfplumber (réglages par défaut) : caractères groupés par orientation,
+    regroupés en lignes, triés dans la ligne puis coupés en mots sur les blancs et les écarts."""
+    words = []
+    for upright, group in itertools.groupby(chars, key=lambda c: c["upright"]):
+        if upright:
+            lines = _cluster_by(list(group), lambda c: c["top"], LINE_Y_TOLERANCE)
+            order = lambda c: c["x0"]
+        else:
+            lines = _cluster_by(list(group), lambda c: c["x0"], LINE_X_TOLERANCE)
+            order = lambda c: (c["top"], c["bottom"])
+        for line in lines:
+            current: List[Dict[str, Any]] = []
+            for c in sorted(line, key=order):
+                if c["text"].isspace():
+                    if current:
+                        words.append(_merge_word(current))
+                    current = []
+                elif current and _begins_new_word(current[-1], c):
+                    words.append(_merge_word(current))
+                    current = [c]
+                else:
+                    current.append(c)
+            if current:
+                words.append(_merge_word(current))
+    return words
+
+
+class _PyMuPDFBackend:
+    """
+    PyMuPDF, sortie alignée sur pdfplumber : mots et lignes reconstruits à partir des
+    caractères (boîtes calculées comme pdfminer) avec l'algorithme et les tolérances de
+    pdfplumber.extract_text, plutôt que les mots / blocs de get_text() qui coupent
+    autrement (« TSH » et « 2.5 » à 2 pt : TSH2.5 pour pdfplumber, deux mots pour MuPDF) ;
+    courbes = point de départ + extrémités des segments, rectangles en coordonnées PDF
+    (origine en bas), comme pdfminer.
+    """
+
+    name = "pymupdf"
+
+    def __init__(self, source):
+        pymupdf = _import_pymupdf()
+        if isinstance(source, (str, os.PathLike)):
+            self._doc = pymupdf.open(source)
+        else:
+            pos = source.tell()
+            source.seek(0)
+            data = source.read()
+            source.seek(pos)
+            self._doc = pymupdf.open(stream=data, filetype="pdf")
+        try:
+            self._check_fonts()
+        except Exception:
+            self._doc.close()
+            raise
+
+    def _check_fonts(self):
+        """
+        Polices symboliques ou Type3 sans ToUnicode : pdfminer lit les codes avec l'encodage
+        déclaré (StandardEncoding par défaut), MuPDF avec l'encodage interne de la police
+        (le ▲ ZapfDingbats codé « s » : « s » pour pdfminer, « L » pour MuPDF). Texte non
+        reproductible : le PDF est refusé, PdfDocument se replie sur pdfplumber.
+        """
+        seen = set()
+        for pno in range(self._doc.page_count):
+            for xref, _, ftype, basefont, *_ in self._doc.get_page_fonts(pno):
+                if xref in seen or ftype == "Type0":
+                    continue
+                seen.add(xref)
+                if self._doc.xref_get_key(xref, "ToUnicode")[0] != "null":
+                    continue
+                name = basefont.split("+", 1)[-1]
+                kind, desc = self._doc.xref_get_key(xref, "FontDescriptor")
+                flags = (self._doc.xref_get_key(int(desc.split()[0]), "Flags")[1]
+                         if kind == "xref" else "0")
+                symbolic = name in ("Symbol", "ZapfDingbats") or int(flags or 0) & 4
+                if ftype == "Type3" or symbolic:
+                    raise ValueError(f"police {name} ({ftype}) sans ToUnicode")
+
+    def page_count(self) -> int:
+        return self._doc.page_count
+
+    def _font_descents(self, page) -> Dict[str, float]:
+        """Descendant (em) de chaque police de la page tel que pdfminer le lit : /Descent du
+        FontDescriptor (forcé négatif), sinon métriques des polices standard, sinon 0."""
+        out: Dict[str, float] = {}
+        for xref, _, ftype, basefont, *_ in page.get_fonts():
+            name = basefont.split("+", 1)[-1]
+            if name in out or ftype == "Type3":
+                continue
+            if ftype == "Type0":
+                kind, val = self._doc.xref_get_key(xref, "DescendantFonts")
+                if kind == "xref":
+                    val = self._doc.xref_object(int(val.split()[0]))
+                m = re.search(r"(\d+) 0 R", val)
+                if not m:
+                    continue
+                xref = int(m.group(1))
+            kind, val = self._doc.xref_get_key(xref, "FontDescriptor")
+            if kind == "xref":
+                kind, val = self._doc.xref_get_key(int(val.split()[0]), "Descent")
+                out[name] = -abs(float(val)) / 1000 if kind in ("int", "float") else 0.0
+            else:
+                out[name] = _STANDARD_FONT_DESCENTS.get(re.split(r"[-,]", name)[0], 0.0)
+        return out
+
+    def _page_chars(self, i: int) -> List[Dict[str, Any]]:
+        # get_texttrace : caractères dans l'ordre du flux de contenu (celui de pdfminer), sans
+        # les espaces que MuPDF synthétise entre les mots
+        page = self._doc[i]
+        descents = self._font_descents(page)
+        chars = []
+        for span in page.get_texttrace():
+            dx, dy = span["dir"]
+            # pdfminer : droit tant que la rotation n'est pas de ±90°
+            upright = abs(dx) > 1e-6
+            # Rotation d'un quart de tour : boîte recalculée ; sinon celle de MuPDF
+            axis = dx == 0 or dy == 0
+            size = span["size"]
+            descent = descents.get(span["font"], span["descender"])
+            for code, glyph, origin, (x0, top, x1, bottom) in span["chars"]:
+                text = chr(code) if code >= 0 else "\ufffd"
+                if glyph < 0 and chars:
+                    # Suite d'un glyphe à plusieurs lettres (ligature « fi ») : un seul
+                    # caractère pour pdfminer
+                    chars[-1]["text"] += text
+                    continue
+                if axis:
+                    # Boîte de pdfminer : largeur = avance, hauteur = corps posé sur le
+                    # descendant, tournée selon la direction (dx, dy) et sa normale (dy, -dx)
+                    adv = (x1 - x0) if dy == 0 else (bottom - top)
+                    h0, h1 = size * descent, size * (1 + descent)
+                    xs = (origin[0], origin[0] + adv * dx)
+                    ys = (origin[1], origin[1] + adv * dy)
+                    x0 = min(xs) + min(h0 * dy, h1 * dy)
+                    x1 = max(xs) + max(h0 * dy, h1 * dy)
+                    top = min(ys) - max(h0 * dx, h1 * dx)
+                    bottom = max(ys) - min(h0 * dx, h1 * dx)
+                chars.append({"text": text, "x0": x0, "x1": x1, "top": top, "bottom": bottom,
+                              "upright": upright})
+        return chars
+
+    def page_words(self, i: int) -> List[Dict[str, Any]]:
+        return _chars_to_words(self._page_chars(i))
+
+    def page_text(self, i: int) -> str:
+        # extract_text de pdfplumber : mots pris dans l'ordre de _chars_to_words, nouvelle
+        # ligne à chaque changement de groupe de hauts (pas de re-tri)
+        words = self.page_words(i)
+        index = _cluster_index((w["top"] for w in words), LINE_Y_TOLERANCE)
+        return "\n".join(
+            " ".join(w["text"] for w in line)
+            for _, line in itertools.groupby(words, key=lambda w: index[w["top"]])
+        )
+
+    def page_graphics(self, i: int) -> PageGraphics:
+        page = self._doc[i]
+        height = page.rect.height
+        curves, rects = [], []
+        for drawing in page.get_drawings():
+            # Sous-chemins : un segment qui ne part pas de la fin du précédent en ouvre un nouveau
+            subpaths: List[List[tuple]] = []
+            end = None
+            for item in drawing["items"]:
+                op = item[0]
+                if op == "re" or op == "qu":
+                    r = item[1].rect if op == "qu" else item[1]
+                    rects.append({"x0": r.x0, "y0": height - r.y1, "x1": r.x1, "y1": height - r.y0})
+                    end = None
+                    continue
+                if end is None or (item[1].x, item[1].y) != end:
+                    subpaths.append([])
+                subpaths[-1].append(item)
+                end = (item[-1].x, item[-1].y)
+            for items in subpaths:
+                # Segment droit isolé = 'line' pour pdfplumber, pas une courbe
+                if len(items) == 1 and items[0][0] == "l":
+                    continue
+                pts = [(items[0][1].x, items[0][1].y)] + [(it[-1].x, it[-1].y) for it in items]
+                curves.append({"pts": pts})
+        return PageGraphics(curves=curves, rects=rects)
+
+    def close(self):
+        self._doc.close()
+
+
+_BACKENDS = {"pymupdf": _PyMuPDFBackend, "pdfplumber": _PdfplumberBackend}
+
+
+def _resolve_backend(name: Optional[str]) -> str:
+    name = (name or PDF_BACKEND).lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"backend PDF inconnu : {name} (attendu : {', '.join(_BACKENDS)})")
+    if name == "pymupdf":
+        try:
+            _import_pymupdf()
+        except ImportError:
+            name = "pdfplumber"
+    if name == "pdfplumber":
+        try:
+            import pdfplumber  # noqa: F401
+        except ImportError as e:
+            raise ImportError("pdfplumber manquant") from e
+    return name
+
+
+# Extraction du texte en parallèle (opt-in) : nombre de process, 0/1 = série.
+# Les rapports plus courts que PARALLEL_MIN_PAGES restent en série (démarrage du pool
+# et ré-ouverture du PDF par chaque worker plus coûteux que le gain).
+PDF_WORKERS = int(os.getenv("ALGOLIFE_PDF_WORKERS", "0") or 0)
+PARALLEL_MIN_PAGES = 8
+
+_text_pool = None
+_text_pool_workers = 0
+_text_pool_lock = threading.Lock()
+
+
+def _extract_page_texts(source, start, stop, backend="pdfplumber"):
+    """Worker : texte des pages [start, stop) (le PDF est rouvert dans le process)."""
+    reader = _BACKENDS[backend](_open_source(source))
+    try:
+        return [reader.page_text(i) for i in range(start, stop)]
+    finally:
+        reader.close()
+
+
+def _get_text_pool(workers):
+    global _text_pool, _text_pool_workers
+    with _text_pool_lock:
+        if _text_pool is None or _text_pool_workers != workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            if _text_pool is not None:
+                _text_pool.shutdown(wait=False)
+            _text_pool = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            _text_pool_workers = workers
+        return _text_pool
+
+
+def shutdown_text_pool():
+    """Arrête le pool d'extraction parallèle (recréé à la demande)."""
+    global _text_pool, _text_pool_workers
+    with _text_pool_lock:
+        if _text_pool is not None:
+            _text_pool.shutdown(wait=True)
+        _text_pool, _text_pool_workers = None, 0
+
+
+class PdfDocument:
+    """
+    PDF ouvert une fois, partagé par la détection de format et les extracteurs.
+
+    Texte, mots et graphiques sont extraits page par page à la première demande puis
+    gardés : un upload n'est parsé qu'une fois quel que soit le nombre de lectures.
+    Accepte un chemin, des bytes ou un fichier ouvert.
+
+    backend : "pymupdf" / "pdfplumber" (défaut : PDF_BACKEND, cf. _resolve_backend).
+
+    workers > 1 (défaut : PDF_WORKERS) : le texte complet est extrait par tranches de
+    pages dans un pool de process, recollé dans l'ordre des pages (chemin ou bytes
+    seulement, à partir de PARALLEL_MIN_PAGES pages).
+    """
+
+    def __init__(self, source, workers: Optional[int] = None, backend: Optional[str] = None):
+        self.backend = _resolve_backend(backend)
+        self.workers = PDF_WORKERS if workers is None else workers
+        # Source transmissible aux workers : chemin ou bytes, pas un fichier ouvert
+        self._shareable = source if isinstance(source, (str, bytes, os.PathLike)) else None
+        if isinstance(source, bytearray):
+            source = self._shareable = bytes(source)
+        self.source = _open_source(source)
+        self._pdf = None              # ouvert au premier accès (rien à parser si le cache répond)
+        self._hash: Optional[str] = None
+        self._texts: Dict[int, str] = {}
+        self._words: Dict[int, List[Dict[str, Any]]] = {}
+        self._graphics: Dict[int, PageGraphics] = {}
+        self._full_text: Optional[str] = None
+
+    @property
+    def pdf(self):
+        """Lecteur du backend (_PyMuPDFBackend / _PdfplumberBackend), ouvert au premier accès."""
+        if self._pdf is None:
+            try:
+                self._pdf = _BACKENDS[self.backend](self.source)
+            except Exception:
+                if self.backend == "pdfplumber":
+                    raise
+                # PDF refusé par PyMuPDF : la référence historique
+                self.backend = _resolve_backend("pdfplumber")
+                if hasattr(self.source, "seek"):
+                    self.source.seek(0)
+                self._pdf = _PdfplumberBackend(self.source)
+        return self._pdf
+
+    @property
+    def content_hash(self) -> str:
+        """sha256 du contenu du fichier (clé du cache d'extraction)."""
+        if self._hash is None:
+            if isinstance(self._shareable, bytes):
+                self._hash = hashlib.sha256(self._shareable).hexdigest()
+            elif self._shareable is not None:
+                self._hash = file_sha256(self._shareable)
+            else:
+                pos = self.source.tell()
+                self.source.seek(0)
+                self._hash = hashlib.sha256(self.source.read()).hexdigest()
+                self.source.seek(pos)
+        return self._hash
+
+    @property
+    def page_count(self) -> int:
+        return self.pdf.page_count()
+
+    def page_text(self, i: int) -> str:
+        if i not in self._texts:
+            self._texts[i] = self.pdf.page_text(i)
+        return self._texts[i]
+
+    def page_words(self, i: int) -> List[Dict[str, Any]]:
+        if i not in self._words:
+            self._words[i] = self.pdf.page_words(i)
+        return self._words[i]
+
+    def page_graphics(self, i: int) -> PageGraphics:
+        if i not in self._graphics:
+            self._graphics[i] = self.pdf.page_graphics(i)
+        return self._graphics[i]
+
+    def _load_texts_parallel(self) -> bool:
+        n = self.page_count
+        missing = [i for i in range(n) if i not in self._texts]
+        if (self.workers <= 1 or self._shareable is None
+                or len(missing) < PARALLEL_MIN_PAGES):
+            return False
+        # ~2 tranches par worker : équilibre les pages lourdes (tableaux, graphiques)
+        step = max(1, -(-n // (self.workers * 2)))
+        try:
+            pool = _get_text_pool(self.workers)
+            futures = [
+                (start, pool.submit(_extract_page_texts, self._shareable, start,
+                                    min(start + step, n), self.backend))
+                for start in range(0, n, step)
+            ]
+            for start, fut in futures:
+                for offset, page_text in enumerate(fut.result()):
+                    self._texts.setdefault(start + offset, page_text)
+        except Exception:
+            # Pool indisponible (process interdits, worker tué...) : la série complète
+            return False
+        return True
+
+    @property
+    def text(self) -> str:
+        """Texte complet (pages jointes par '\\n', comme avant)."""
+        if self._full_text is None:
+            self._load_texts_parallel()
+            self._full_text = "\n".join(self.page_text(i) for i in range(self.page_count))
+        return self._full_text
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_pdf_document(source, workers: Optional[int] = None,
+                      backend: Optional[str] = None) -> PdfDocument:
+    """Chemin / bytes / fichier -> PdfDocument ; un PdfDocument est renvoyé tel quel."""
+    if isinstance(source, PdfDocument):
+        return source
+    return PdfDocument(source, workers=workers, backend=backend)
+
+
+class _borrowed_document:
+    """with _borrowed_document(src) as doc : ferme le document seulement s'il a été ouvert ici."""
+
+    def __init__(self, source):
+        self._owned = not isinstance(source, PdfDocument)
+        self.doc = open_pdf_document(source)
+
+    def __enter__(self) -> PdfDocument:
+        return self.doc
+
+    def __exit__(self, *exc):
+        if self._owned:
+            self.doc.close()
+
+
+def _read_pdf_text(pdf_path):
+    """Lit le texte complet d'un PDF (chemin ou PdfDocument)"""
+    with _borrowed_document(pdf_path) as doc:
+        return doc.text
+
+
+# À incrémenter à chaque changement de parsing : invalide les extractions en cache
+EXTRACTOR_VERSION = "18.1-4"
+
+
+def _cache_arg(value):
+    """Argument dans la clé de cache : fichier existant -> hash de son contenu."""
+    if isinstance(value, str) and os.path.isfile(value):
+        return file_sha256(value)
+    return repr(value)
+
+
+def _cached_extraction(fn):
+    """
+    Résultat mémorisé dans le cache disque (extraction_cache, opt-in), clé = contenu du
+    PDF + extracteur + EXTRACTOR_VERSION + autres arguments (progress exclu). Sur un hit le
+    PDF n'est pas parsé ; chaque appel reçoit sa propre copie du résultat. Une exception
+    n'est jamais mise en cache.
+    """
+    sig = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(pdf_path, *args, **kwargs):
+        cache = get_extraction_cache()
+        if cache is None:
+            return fn(pdf_path, *args, **kwargs)
+        with _borrowed_document(pdf_path) as doc:
+            try:
+                bound = sig.bind(doc, *args, **kwargs)
+                bound.apply_defaults()
+                extra = [f"{k}={_cache_arg(v)}" for k, v in list(bound.arguments.items())[1:]
+                         if k != "progress"]
+                key = make_key(fn.__name__, EXTRACTOR_VERSION, doc.backend, doc.content_hash, *extra)
+            except OSError:
+                return fn(doc, *args, **kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = fn(doc, *args, **kwargs)
+            cache.put(key, value)
+            return value
+
+    return wrapper
 
 
 _IGNORE_PATTERNS = [
@@ -211,6 +748,10 @@ _IGNORE_PATTERNS = [
 ]
 
 
+# Compilé une fois : une seule recherche par ligne au lieu de 13
+_NOISE_RE = re.compile("|".join(f"(?:{pat})" for pat in _IGNORE_PATTERNS), flags=re.IGNORECASE)
+
+
 def _is_noise_line(line):
     """Vérifie si une ligne est du bruit"""
     if not line:
@@ -218,62 +759,56 @@ def _is_noise_line(line):
     s = line.strip()
     if len(s) < 4:
         return True
-    for pat in _IGNORE_PATTERNS:
-        if re.search(pat, s, flags=re.IGNORECASE):
-            return True
-    return False
+    return _NOISE_RE.search(s) is not None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scanner de lignes Synlab / Unilabs
+# ─────────────────────────────────────────────────────────────────────────────
+# Les 3 formats dans une seule alternance, essayés dans l'ordre historique (Belge,
+# Français avec parenthèses, Français sans) : m.lastgroup donne le format reconnu.
+
+# Format 1: Belge "GLUCOSE 5.2 0.70 - 1.05 g/L"
+_SYNLAB_BE = (
+    r"(?:>\s*)?"
+    r"(?P<be_n>[A-Za-zÀ-ÿ0-9\.\-\/\s]{3,60}?)\s+"
+    r"(?P<be_valsign>[\+\-])?\s*(?P<be_value>\d+(?:[.,]\d+)?)\s+"
+    r"(?P<be_ref>\d+(?:[.,]\d+)?\s*-\s*\d+(?:[.,]\d+)?)\s+"
+    r"(?P<be_unit>[A-Za-zµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)\s*$"
+)
+# Format 2: Français avec parenthèses "GLUCOSE 5.2 g/L (0.70 - 1.05)"
+_SYNLAB_FR_PARENS = (
+    r"(?P<frp_n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
+    r"(?P<frp_value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s*"
+    r"(?P<frp_unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s*"
+    r"\((?P<frp_ref>[^)]+)\)"
+)
+# Format 3: Français sans parenthèses "GLUCOSE 5.2 g/L 0.70 - 1.05"
+_SYNLAB_FR_NO_PARENS = (
+    r"(?P<frn_n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
+    r"(?P<frn_value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s+"
+    r"(?P<frn_unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s+"
+    r"(?P<frn_ref>\d+(?:[.,]\d+)?\s*[-—–]\s*\d+(?:[.,]\d+)?)"
+)
+_SYNLAB_LINE_RE = re.compile(
+    rf"^(?:(?P<be>{_SYNLAB_BE})|(?P<frp>{_SYNLAB_FR_PARENS})|(?P<frn>{_SYNLAB_FR_NO_PARENS}))",
+    flags=re.UNICODE,
+)
+# Format -> (nom, valeur, unité, référence)
+_SYNLAB_FIELDS = {
+    "be":  ("be_n", "be_value", "be_unit", "be_ref"),
+    "frp": ("frp_n", "frp_value", "frp_unit", "frp_ref"),
+    "frn": ("frn_n", "frn_value", "frn_unit", "frn_ref"),
+}
+# Lignes d'automate (ex. "SIEMENS ...") ignorées pour les formats français
+_SIEMENS_RE = re.compile(r"\bSIEMENS\b", flags=re.IGNORECASE)
 
 
-def extract_synlab_biology(pdf_path, progress=None):
-    """
-    Extrait les biomarqueurs biologiques d'un PDF Synlab/Unilabs
-    
-    Supporte 3 formats:
-    1. Français avec parenthèses: "GLUCOSE 5.2 g/L (0.70 - 1.05)"
-    2. Français sans parenthèses: "GLUCOSE 5.2 g/L 0.70 - 1.05"
-    3. Belge: "GLUCOSE 5.2 0.70 - 1.05 g/L"
-    4. Fallback: Références par défaut
-    """
-    if progress:
-        progress.update(5, "Lecture PDF biologie...")
-    
-    text = _read_pdf_text(pdf_path)
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+def _parse_synlab_lines(lines, progress=None):
+    """Lignes non vides d'un compte rendu Synlab/Unilabs -> {nom: {value, unit, reference, status}}"""
     out = {}
-    
-    if progress:
-        progress.update(15, "Parsing biomarqueurs...")
-
-    # Pattern 1: Français avec parenthèses
-    pat_fr_parens = re.compile(
-        r"^(?P<n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
-        r"(?P<value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s*"
-        r"(?P<unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s*"
-        r"\((?P<ref>[^)]+)\)",
-        flags=re.UNICODE,
-    )
-
-    # Pattern 2: Français sans parenthèses
-    pat_fr_no_parens = re.compile(
-        r"^(?P<n>[A-ZÀ-Ÿ0-9\.\-\/\s]{3,60})\s+"
-        r"(?P<value>[<>]?\s*[\+\-]?\s*\d+(?:[.,]\d+)?)\s+"
-        r"(?P<unit>[a-zA-ZµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)?\s+"
-        r"(?P<ref>\d+(?:[.,]\d+)?\s*[-—–]\s*\d+(?:[.,]\d+)?)",
-        flags=re.UNICODE,
-    )
-
-    # Pattern 3: Belge
-    pat_be = re.compile(
-        r"^(?:>\s*)?"
-        r"(?P<n>[A-Za-zÀ-ÿ0-9\.\-\/\s]{3,60}?)\s+"
-        r"(?P<valsign>[\+\-])?\s*(?P<value>\d+(?:[.,]\d+)?)\s+"
-        r"(?P<ref>\d+(?:[.,]\d+)?\s*-\s*\d+(?:[.,]\d+)?)\s+"
-        r"(?P<unit>[A-Za-zµμÎ¼/%]+(?:\s*[a-zA-ZµμÎ¼/%]+)?)\s*$",
-        flags=re.UNICODE,
-    )
-
     total_lines = len(lines)
-    matched_count = 0
+    scan = _SYNLAB_LINE_RE.match
     
     for idx, ln in enumerate(lines):
         if _is_noise_line(ln):
@@ -283,48 +818,19 @@ def extract_synlab_biology(pdf_path, progress=None):
             percent = 15 + int((idx / total_lines) * 15)
             progress.update(percent, f"Biomarqueur {idx}/{total_lines}...")
 
-        # Essai 1: Belge
-        m = pat_be.match(ln)
-        if m:
-            name = m.group("n").strip()
-            value_str = m.group("value")
-            unit = (m.group("unit") or "").strip()
-            ref = _clean_ref(m.group("ref"))
-            value_float = _safe_float(value_str)
-            status = determine_biomarker_status(value_float, ref, name)
-            out[name] = {"value": value_float, "unit": unit, "reference": ref, "status": status}
-            matched_count += 1
+        m = scan(ln)
+        if not m:
             continue
-
-        # Essai 2: Français AVEC parenthèses
-        m = pat_fr_parens.match(ln)
-        if m:
-            name = m.group("n").strip()
-            if re.search(r"\bSIEMENS\b", name, flags=re.IGNORECASE):
-                continue
-            value_str = m.group("value")
-            unit = (m.group("unit") or "").strip()
-            ref = _clean_ref(m.group("ref"))
-            value_float = _safe_float(value_str)
-            status = determine_biomarker_status(value_float, ref, name)
-            out[name] = {"value": value_float, "unit": unit, "reference": ref, "status": status}
-            matched_count += 1
-            continue
-
-        # Essai 3: Français SANS parenthèses
-        m = pat_fr_no_parens.match(ln)
-        if m:
-            name = m.group("n").strip()
-            if re.search(r"\bSIEMENS\b", name, flags=re.IGNORECASE):
-                continue
-            value_str = m.group("value")
-            unit = (m.group("unit") or "").strip()
-            ref = _clean_ref(m.group("ref"))
-            value_float = _safe_float(value_str)
-            status = determine_biomarker_status(value_float, ref, name)
-            out[name] = {"value": value_float, "unit": unit, "reference": ref, "status": status}
-            matched_count += 1
+        fmt = m.lastgroup
+        g_name, g_value, g_unit, g_ref = _SYNLAB_FIELDS[fmt]
+        name = m.group(g_name).strip()
+        if fmt != "be" and _SIEMENS_RE.search(name):
             continue
+        unit = (m.group(g_unit) or "").strip()
+        ref = _clean_ref(m.group(g_ref))
+        value_float = _safe_float(m.group(g_value))
+        status = determine_biomarker_status(value_float, ref, name)
+        out[name] = {"value": value_float, "unit": unit, "reference": ref, "status": status}
 
     # Fallback: Ajouter références par défaut si manquantes
     for biomarker_name, data in out.items():
@@ -337,6 +843,33 @@ def extract_synlab_biology(pdf_path, progress=None):
                     default_ref, 
                     biomarker_name
                 )
+    
+    return out
+
+
+@_cached_extraction
+def extract_synlab_biology(pdf_path, progress=None):
+    """
+    Extrait les biomarqueurs biologiques d'un PDF Synlab/Unilabs
+    
+    Supporte 3 formats:
+    1. Français avec parenthèses: "GLUCOSE 5.2 g/L (0.70 - 1.05)"
+    2. Français sans parenthèses: "GLUCOSE 5.2 g/L 0.70 - 1.05"
+    3. Belge: "GLUCOSE 5.2 0.70 - 1.05 g/L"
+    4. Fallback: Références par défaut
+
+    pdf_path: chemin ou PdfDocument déjà ouvert (cf. open_pdf_document)
+    """
+    if progress:
+        progress.update(5, "Lecture PDF biologie...")
+    
+    text = _read_pdf_text(pdf_path)
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    
+    if progress:
+        progress.update(15, "Parsing biomarqueurs...")
+
+    out = _parse_synlab_lines(lines, progress)
 
     if progress:
         progress.update(30, f"Biologie: {len(out)} biomarqueurs")
@@ -344,11 +877,13 @@ def extract_synlab_biology(pdf_path, progress=None):
     return out
 
 
+@_cached_extraction
 def extract_lims_biology(pdf_path, progress=None):
     """
     Extrait les biomarqueurs d'un PDF LIMS (mbnext group Europe / Louvain-la-Neuve).
     Format: "Nom [▲|▼] valeur unité référence"
     Supporte plages (X - Y), limites (< X ou > X), qualitatifs (NORMAL), FUT2.
+    pdf_path: chemin ou PdfDocument déjà ouvert.
     """
     if progress:
         progress.update(5, "Lecture PDF LIMS...")
@@ -434,24 +969,31 @@ def extract_lims_biology(pdf_path, progress=None):
 
 
 def detect_pdf_lab_format(pdf_path):
-    """Détecte automatiquement le format du PDF labo (Synlab/Unilabs vs LIMS vs autre)"""
+    """Détecte automatiquement le format du PDF labo (Synlab/Unilabs vs LIMS vs autre).
+    Passer un PdfDocument pour que l'extracteur choisi réutilise le texte déjà lu."""
     try:
-        text = _read_pdf_text(pdf_path)
-        text_upper = text.upper()
-        if "LIMS" in text_upper and ("LOUVAIN" in text_upper or "MBNEXT" in text_upper):
-            return "lims"
-        if "SYNLAB" in text_upper:
-            return "synlab"
-        if "UNILABS" in text_upper:
-            return "unilabs"
-        # Heuristique: si on voit le format "Résultats Unités Valeurs de référence"
-        if "VALEURS DE RÉFÉRENCE" in text_upper and "DATE PRESCRIPTION" in text_upper:
-            return "lims"
-        return "synlab"  # fallback
+        return _detect_pdf_lab_format(pdf_path)
     except Exception:
         return "synlab"
 
 
+@_cached_extraction
+def _detect_pdf_lab_format(pdf_path):
+    # Lève en cas d'échec de lecture : seul un format réellement détecté est mis en cache
+    text = _read_pdf_text(pdf_path)
+    text_upper = text.upper()
+    if "LIMS" in text_upper and ("LOUVAIN" in text_upper or "MBNEXT" in text_upper):
+        return "lims"
+    if "SYNLAB" in text_upper:
+        return "synlab"
+    if "UNILABS" in text_upper:
+        return "unilabs"
+    # Heuristique: si on voit le format "Résultats Unités Valeurs de référence"
+    if "VALEURS DE RÉFÉRENCE" in text_upper and "DATE PRESCRIPTION" in text_upper:
+        return "lims"
+    return "synlab"  # fallback
+
+
 def _extract_bacterial_groups_v2(text):
     """Extraction des 12 groupes bactériens standards"""
     
@@ -595,11 +1137,14 @@ def _map_abundance_to_status(abundance_level):
         return "Strongly Elevated"
 
 
+@_cached_extraction
 def extract_idk_microbiome(pdf_path, excel_path=None, enable_graphical_detection=True,
                           resolution=200, progress=None):
     """
     Extrait les données microbiome depuis rapport IDK® GutMAP
     
+    pdf_path: chemin ou PdfDocument ; texte et graphiques de chaque page ne sont lus qu'une fois
+    
     Returns:
         dict: {
             'dysbiosis_index', 'dysbiosis_text', 'diversity',
@@ -608,15 +1153,15 @@ def extract_idk_microbiome(pdf_path, excel_path=None, enable_graphical_detection
             'metabolites'
         }
     """
-    try:
-        import pdfplumber
-    except ImportError as e:
-        raise ImportError("pdfplumber requis") from e
-    
+    with _borrowed_document(pdf_path) as doc:
+        return _extract_idk_microbiome(doc, excel_path, enable_graphical_detection, progress)
+
+
+def _extract_idk_microbiome(doc, excel_path, enable_graphical_detection, progress):
     if progress:
         progress.update(35, "Lecture microbiome...")
     
-    text = _read_pdf_text(pdf_path)
+    text = doc.text
     lines = text.splitlines()
     
     # Dysbiosis Index
@@ -735,23 +1280,21 @@ def extract_idk_microbiome(pdf_path, excel_path=None, enable_graphical_detection
     
     if enable_graphical_detection:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num in range(len(pdf.pages)):
-                    page = pdf.pages[page_num]
-                    page_text = page.extract_text() or ""
-                    
-                    has_bacteria_table = (
-                        'Category' in page_text and
-                        re.search(r'^\d{3}\s+[A-Za-z]', page_text, re.MULTILINE) and
-                        'REPORT FORM EXPLANATION' not in page_text and
-                        'COMMON HUMAN GUT BACTERIA' not in page_text
-                    )
-                    
-                    if not has_bacteria_table:
-                        continue
-                    
-                    page_dots = _extract_dots_from_pdf_page(page)
-                    all_dots.extend(page_dots)
+            for page_num in range(doc.page_count):
+                page_text = doc.page_text(page_num)
+                
+                has_bacteria_table = (
+                    'Category' in page_text and
+                    re.search(r'^\d{3}\s+[A-Za-z]', page_text, re.MULTILINE) and
+                    'REPORT FORM EXPLANATION' not in page_text and
+                    'COMMON HUMAN GUT BACTERIA' not in page_text
+                )
+                
+                if not has_bacteria_table:
+                    continue
+                
+                page_dots = _extract_dots_from_pdf_page(doc.page_graphics(page_num))
+                all_dots.extend(page_dots)
         
         except Exception:
             pass
@@ -0,0 +1,78 @@
+"""
+ALGO-LIFE - Normalisation des libellés (biomarqueurs, bactéries)
+
+Partagée par rules_engine et extractors : un même libellé de labo n'est normalisé
+qu'une fois par process. Mémoïsation bornée et thread-safe (functools.lru_cache,
+typed=True pour que 1 / 1.0 / '1' restent distincts), statistiques hits / misses.
+"""
+from __future__ import annotations
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict
+
+# Nombre de libellés distincts conservés par normaliseur
+CACHE_SIZE = 8192
+
+_RE_PARENS   = re.compile(r"\(.*?\)")
+_RE_RULE_BAD = re.compile(r"[^a-z0-9 &]")
+_RE_LAB_BAD  = re.compile(r"[^A-Z0-9\s\-\+/]")
+_RE_SPACES   = re.compile(r"\s+")
+
+_LAB_ACRONYMS = {
+    "C P K": "CPK", "L D L": "LDL", "H D L": "HDL",
+    "V G M": "VGM", "T C M H": "TCMH", "C C M H": "CCMH",
+    "C R P": "CRP", "T S H": "TSH", "D F G": "DFG",
+    "G P T": "GPT", "G O T": "GOT"
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def normalize_rule_key(s: Any) -> str:
+    """Clé de matching du moteur : minuscules, sans accents ni parenthèses, [a-z0-9 &]."""
+    s = str(s).strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = _RE_PARENS.sub("", s).strip()
+    s = _RE_RULE_BAD.sub(" ", s)
+    return _RE_SPACES.sub(" ", s).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def normalize_lab_label(name: Any) -> str:
+    """Libellé de compte rendu : majuscules, sans accents, sigles recollés (C R P -> CRP)."""
+    if name is None:
+        return ""
+    s = str(name).strip()
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.upper()
+    s = s.replace(".", " ")
+    s = s.replace(",", " ")
+    s = s.replace("'", "'")
+    s = _RE_LAB_BAD.sub(" ", s)
+    s = _RE_SPACES.sub(" ", s).strip()
+    for old, new in _LAB_ACRONYMS.items():
+        s = s.replace(old, new)
+    return s
+
+
+_NORMALIZERS = {
+    "rule_key":  normalize_rule_key,
+    "lab_label": normalize_lab_label,
+}
+
+
+def normalization_stats() -> Dict[str, Dict[str, int]]:
+    """hits / misses / taille courante par normaliseur (JSON-sérialisable)."""
+    out = {}
+    for name, fn in _NORMALIZERS.items():
+        info = fn.cache_info()
+        out[name] = {"hits": info.hits, "misses": info.misses,
+                     "size": info.currsize, "maxsize": info.maxsize}
+    return out
+
+
+def clear_normalization_cache():
+    for fn in _NORMALIZERS.values():
+        fn.cache_clear()
@@ -0,0 +1,133 @@
+"""
+ALGO-LIFE - Format colonnaire du règlement compilé (fichier mappé en mémoire)
+
+Un fichier = magic + en-tête JSON + tableaux NumPy alignés + table de chaînes
+(offsets int64 + blob UTF-8, chaînes dédupliquées). Ouvert en mmap lecture seule :
+tous les process qui mappent le même fichier partagent les mêmes pages (cache
+du noyau) au lieu de garder chacun leurs DataFrames et textes de règles.
+
+Ce module ne connaît que le format ; l'encodage des règles est dans rules_engine
+(RulesEngine.export_columnar / RulesEngine.from_columnar).
+"""
+from __future__ import annotations
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MAGIC = b"ALRBOOK1"
+FORMAT = 1
+_ALIGN = 64
+_HEAD = struct.Struct("<8sQ")   # magic, longueur de l'en-tête JSON
+
+
+class StringTable:
+    """Construction de la table de chaînes : add(s) -> indice, chaînes identiques partagées."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._items: List[bytes] = []
+
+    def add(self, s: str) -> int:
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self._items)
+            self._items.append(s.encode("utf-8"))
+        return i
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        offsets = np.zeros(len(self._items) + 1, dtype=np.int64)
+        if self._items:
+            np.cumsum([len(b) for b in self._items], out=offsets[1:])
+        blob = np.frombuffer(b"".join(self._items), dtype=np.uint8)
+        return {"strings.offsets": offsets, "strings.blob": blob}
+
+
+class MappedStrings:
+    """Table de chaînes lue dans le fichier mappé, décodée à l'accès."""
+
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self._offsets = offsets
+        self._blob    = blob
+
+    def __getitem__(self, i: int) -> str:
+        a, b = self._offsets[i], self._offsets[i + 1]
+        return self._blob[a:b].tobytes().decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def write(path: str, header: Dict[str, Any], arrays: Dict[str, np.ndarray], strings: StringTable):
+    """Écrit le fichier (atomique : temporaire puis rename)."""
+    arrays = {**arrays, **strings.arrays()}
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    head = json.dumps({**header, "format": FORMAT, "arrays": layout}, ensure_ascii=False).encode("utf-8")
+    data_start = _HEAD.size + len(head)
+    data_start += _pad(data_start)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEAD.pack(MAGIC, len(head)))
+            f.write(head)
+            f.write(b"\0" * (data_start - _HEAD.size - len(head)))
+            for name, arr in arrays.items():
+                f.write(arr.tobytes())
+                f.write(b"\0" * _pad(arr.nbytes))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class MappedFile:
+    """Fichier colonnaire ouvert en lecture seule ; array(nom) = vue NumPy sur le mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, head_len = _HEAD.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} : pas un règlement colonnaire ALGO-LIFE")
+        self.header: Dict[str, Any] = json.loads(self._mm[_HEAD.size:_HEAD.size + head_len].decode("utf-8"))
+        if self.header.get("format") != FORMAT:
+            raise ValueError(f"{path} : format {self.header.get('format')} non supporté")
+        start = _HEAD.size + head_len
+        self._data_start = start + _pad(start)
+        self.strings = MappedStrings(self.array("strings.offsets"), self.array("strings.blob"))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.header["arrays"]
+
+    def array(self, name: str) -> np.ndarray:
+        spec  = self.header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=self._data_start + spec["offset"])
+        return arr.reshape(spec["shape"])
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        return self.array(name) if name in self else None
@@ -1,5 +1,5 @@
 """
-ALGO-LIFE Rules Engine v3.2 - Basé sur analyse réelle de Bases_regles_Synlab.xlsx
+ALGO-LIFE Rules Engine v3.3 - Basé sur analyse réelle de Bases_regles_Synlab.xlsx
 Fixes v3.2 (après inspection des fichiers Excel réels) :
 
 BIO :
@@ -14,24 +14,61 @@ MICROBIOME (refonte totale) :
   - Condition_declenchement : contient 'lévation' (élevé) ou 'éduction' (réduit)
   - Niveau_gravite : entier ou string '+1 (LÉGER)', '-2 (MODÉRÉ)', 3, etc.
   - stool_biomarkers (calprotectine, sIgA, histamine...) aussi traités
+
+COMPILATION :
+  - Feuilles bio compilées au chargement (_BioRule) : nom normalisé, normes H/F parsées,
+    textes BASSE/HAUTE -> generate_recommendations ne fait plus que lookups + comparaisons
+  - _NameIndex : matching nom patient -> règles (exact + sous-chaîne) indexé et mémoïsé par libellé
+  - evaluate_batch : cohorte patients x biomarqueurs évaluée en bloc (NumPy) sur les normes compilées
+  - Chargement en une passe (classeur ouvert une fois, lecture seule, feuilles utiles seulement)
+  - Microbiote : règle retenue pré-résolue par (marqueur, direction, niveau ±1..3) ;
+    biomarqueurs fécaux : première ligne de gravité +/- résolue au chargement
+  - Cache disque du règlement compilé (pickle) clé = sha256 du classeur + version moteur ;
+    l'Excel n'est relu qu'en cas de miss
+  - RulesEngineReloader : rechargement à chaud du classeur, échange atomique du moteur ;
+    chaque résultat porte 'rulebook_version'
+  - Instrumentation : METRICS (registre process-wide) temps / matches / déclenchements par étape
+    et par règle, export() structuré ; console muette sauf ALGOLIFE_RULES_VERBOSE=1
+  - evaluate() : évaluation réentrante, trace par appel (EvaluationTrace) au lieu de self.debug_log
+  - IncrementalEvaluation : correction d'une valeur bio -> seules les règles dépendantes sont réévaluées
+  - Axes thérapeutiques : mots-clés compilés en une seule regex, axe mémoïsé par (catégorie, biomarqueur)
+  - _normalize : mémoïsé process-wide (normalization.py, partagé avec extractors), stats dans METRICS.export()
+  - Recos : 'recommendations' = RuleText (table de textes par version de classeur, tenue par le moteur,
+    résolus à la lecture ; le pickle embarque les textes -> relisible dans tout process) ;
+    listes par domaine (nutrition_recommendations...) = DomainTexts, vues paresseuses sur 'all'
+  - diagnose_panel : diagnostic de tout un panel via l'index des noms (diagnose_biomarker = panel de 1)
+  - Bornes bio H/F précompilées au chargement (repli F -> H inclus) en tableaux (2, n) alignés :
+    evaluate_batch compare toute une cohorte mixte en une passe (ligne de bornes par patient)
+  - stream_recommendations : recos émises dès leur déclenchement, dédupliquées au fil de l'eau
+  - Format colonnaire (rules_columnar) : export_columnar / from_columnar / columnar=True ;
+    fichier mappé en lecture seule partagé par tous les workers, textes décodés à l'accès
 """
 from __future__ import annotations
-import os, re, unicodedata
-from typing import Any, Dict, List, Optional, Tuple
+import hashlib, io, os, pickle, re, tempfile, threading, time, weakref
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
 
+import rules_columnar
+from normalization import normalization_stats, normalize_rule_key
+
+
+ENGINE_VERSION = "3.3"
+# Format des structures compilées persistées : à incrémenter à chaque changement
+_COMPILED_FORMAT = 5
+
+# Sortie console des logs de chargement / évaluation (désactivée par défaut)
+VERBOSE = os.getenv("ALGOLIFE_RULES_VERBOSE", "") == "1"
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Utilitaires texte
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _normalize(s: str) -> str:
-    s = str(s).strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
-    s = re.sub(r"\(.*?\)", "", s).strip()
-    s = re.sub(r"[^a-z0-9 &]", " ", s)
-    return re.sub(r"\s+", " ", s).strip()
+# Normalisation mémoïsée, partagée avec extractors (cf. normalization.py)
+_normalize = normalize_rule_key
 
 
 def _safe_str(v: Any) -> str:
@@ -80,6 +117,487 @@ def _parse_gravite(g: Any) -> int:
     return int(m.group(1)) if m else 0
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Compilation des feuilles bio
+# ─────────────────────────────────────────────────────────────────────────────
+
+_DIRECTIONS = ("BASSE", "HAUTE")
+
+
+def _sex_key(sex: Any) -> str:
+    """'H' pour homme (H/M), 'F' sinon - même règle que la sélection de colonne historique."""
+    return "H" if str(sex).upper() in ("H", "M") else "F"
+
+
+@dataclass
+class _BioRule:
+    """Ligne de feuille bio compilée : nom normalisé, normes parsées, recs par direction."""
+    name:     str
+    key:      str
+    category: str
+    norms:    Dict[str, Tuple[str, Optional[float], Optional[float]]]  # 'H'/'F' -> (texte, low, high)
+    recs:     Dict[str, Dict[str, str]]                               # 'BASSE'/'HAUTE' -> textes
+    payload:  Dict[str, "RuleText"] = field(default_factory=dict)    # idem, internés (au chargement)
+
+
+def _norm_column(columns: List[str], sex_key: str) -> str:
+    col = "Normes H" if sex_key == "H" else "Normes F"
+    if col not in columns:
+        for c in columns:
+            if "norme" in c.lower():
+                col = c; break
+    return col
+
+
+def _compile_bio_sheet(df: Optional[pd.DataFrame]) -> List[_BioRule]:
+    """
+    Compile une feuille bio (BASE_40 / EXTENDED_92 / FONCTIONNEL_134) en table de règles.
+    Normalisation du nom, parsing des normes H/F (fallback 'Normes H' si F vide)
+    et textes de recommandation sont résolus une seule fois au chargement.
+    """
+    if df is None or df.empty:
+        return []
+
+    columns  = list(df.columns)
+    norm_col = {sk: _norm_column(columns, sk) for sk in ("H", "F")}
+    rules: List[_BioRule] = []
+
+    for row in df.to_dict("records"):
+        bm_raw = _safe_str(row.get("Biomarqueur", ""))
+        if not bm_raw:
+            continue
+
+        norms = {}
+        for sk, col in norm_col.items():
+            norm_raw = row.get(col)
+            if _safe_str(norm_raw) == "" and col != "Normes H":
+                norm_raw = row.get("Normes H")
+            low, high = _parse_norm(norm_raw)
+            norms[sk] = (_safe_str(norm_raw), low, high)
+
+        rules.append(_BioRule(
+            name=bm_raw,
+            key=_normalize(bm_raw),
+            category=_safe_str(row.get("Categorie", row.get("Catégorie", "Biologie"))),
+            norms=norms,
+            recs={
+                d: {
+                    "interpretation": _safe_str(row.get(f"{d} - Interprétation", "")),
+                    "nutrition":      _safe_str(row.get(f"{d} - Nutrition", "")),
+                    "supplementation":_safe_str(row.get(f"{d} - Micronutrition", "")),
+                    "lifestyle":      _safe_str(row.get(f"{d} - Lifestyle", "")),
+                }
+                for d in _DIRECTIONS
+            },
+        ))
+    return rules
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Compilation des règles microbiote
+# ─────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class _MicroRule:
+    """Ligne de la feuille Microbiote compilée (gravité parsée, textes)."""
+    category: str
+    gravite:  int
+    recs:     Dict[str, str]
+    payload:  Optional["RuleText"] = None                              # textes internés (au chargement)
+
+
+@dataclass
+class _MicroMarker:
+    """Règles d'un marqueur bactérien + sélection pré-résolue par (élevé ?, niveau 1..3)."""
+    rows:  List[Tuple[bool, bool, _MicroRule]]          # (règle élévation, règle réduction, règle)
+    table: Dict[Tuple[bool, int], Optional[_MicroRule]]
+    # Biomarqueurs fécaux : première ligne de gravité > 0 / < 0 / non nulle
+    stool: Dict[str, Optional[_MicroRule]]
+
+
+def _select_micro_rule(
+    rows: List[Tuple[bool, bool, _MicroRule]], is_elevated: bool, abs_level: int
+) -> Optional[_MicroRule]:
+    """Meilleure règle : bonne direction, niveau exact = max points, sinon le plus proche."""
+    best, best_score = None, -1
+    for is_elev_rule, is_redu_rule, rule in rows:
+        if is_elevated and not is_elev_rule: continue
+        if not is_elevated and not is_redu_rule: continue
+
+        rule_abs = abs(rule.gravite) if rule.gravite != 0 else 1
+        score = 10 if rule_abs == abs_level else (5 - abs(rule_abs - abs_level))
+        if score > best_score:
+            best_score, best = score, rule
+    return best
+
+
+def _compile_micro_marker(grp: pd.DataFrame) -> _MicroMarker:
+    rows = []
+    for rr in grp.to_dict("records"):
+        cond    = _safe_str(rr.get("Condition_declenchement", "")).lower()
+        gravite = _parse_gravite(rr.get("Niveau_gravite"))
+        rule = _MicroRule(
+            category=_safe_str(rr.get("Categorie", "Microbiote")),
+            gravite=gravite,
+            recs={
+                "interpretation": _safe_str(rr.get("Interpretation_clinique")),
+                "nutrition":      _safe_str(rr.get("Recommandations_nutritionnelles")),
+                "supplementation":_safe_str(rr.get("Recommandations_supplementation")),
+                "lifestyle":      _safe_str(rr.get("Recommandations_lifestyle")),
+                "monitoring":     _safe_str(rr.get("Notes_additionnelles")),
+            },
+        )
+        # Direction : Élévation / Réduction (texte ou signe de la gravité)
+        rows.append((("lev" in cond) or (gravite > 0), ("duc" in cond) or (gravite < 0), rule))
+    table = {
+        (elev, lvl): _select_micro_rule(rows, elev, lvl)
+        for elev in (True, False) for lvl in (1, 2, 3)
+    }
+    stool = {
+        "pos": next((r for _, _, r in rows if r.gravite > 0), None),
+        "neg": next((r for _, _, r in rows if r.gravite < 0), None),
+        "any": next((r for _, _, r in rows if r.gravite != 0), None),
+    }
+    return _MicroMarker(rows=rows, table=table, stool=stool)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Textes de règles internés
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _RuleTextTable(dict):
+    """rule_id -> textes d'une version de classeur (dict référençable faiblement)."""
+    __slots__ = ("__weakref__",)
+
+
+# Tables par version de classeur, détenues par les moteurs (et les RuleText des résultats) :
+# une version disparaît d'ici dès que plus rien ne la référence (moteur remplacé et libéré).
+_RULE_TEXTS: "weakref.WeakValueDictionary[str, _RuleTextTable]" = weakref.WeakValueDictionary()
+_RULE_TEXTS_LOCK = threading.Lock()
+
+
+def _rule_text_table(rulebook_version: str) -> _RuleTextTable:
+    """Table partagée de la version (deux moteurs du même classeur partagent leurs textes)."""
+    with _RULE_TEXTS_LOCK:
+        table = _RULE_TEXTS.get(rulebook_version)
+        if table is None:
+            table = _RULE_TEXTS[rulebook_version] = _RuleTextTable()
+        return table
+
+
+class RuleText(Mapping):
+    """
+    Textes de recommandation d'une règle (interpretation, nutrition, supplementation,
+    lifestyle, monitoring) résolus à la lecture dans la table de sa version : une instance
+    par règle partagée par tous les résultats (+ surcharges éventuelles).
+    Le pickle embarque les textes : relu dans un process où la même version est chargée,
+    il se rattache à la table partagée, sinon il reste autonome.
+    """
+
+    __slots__ = ("rule_id", "_extra", "_table")
+
+    def __init__(self, rule_id: str, extra: Optional[Dict[str, str]] = None,
+                 table: Optional[Mapping] = None):
+        self.rule_id = rule_id
+        self._extra  = extra
+        self._table  = table
+
+    def __getitem__(self, k: str) -> str:
+        if self._extra and k in self._extra:
+            return self._extra[k]
+        return self._table[self.rule_id][k]
+
+    def __iter__(self) -> Iterator[str]:
+        texts = self._table[self.rule_id]
+        yield from texts
+        if self._extra:
+            yield from (k for k in self._extra if k not in texts)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        return _restore_rule_text, (self.rule_id, dict(self._table[self.rule_id]), self._extra)
+
+    def __repr__(self) -> str:
+        return f"RuleText({self.rule_id!r})"
+
+    def with_extra(self, **extra: str) -> "RuleText":
+        """Même règle, champs surchargés pour un patient (ex. monitoring des selles)."""
+        return RuleText(self.rule_id, {**(self._extra or {}), **extra}, self._table)
+
+
+def _restore_rule_text(rule_id: str, texts: Dict[str, str], extra: Optional[Dict[str, str]]) -> RuleText:
+    with _RULE_TEXTS_LOCK:
+        table = _RULE_TEXTS.get(rule_id.split(":", 1)[0])
+    if table is None or rule_id not in table:
+        table = {rule_id: texts}
+    return RuleText(rule_id, extra, table)
+
+
+class DomainTexts(Sequence):
+    """
+    Textes non vides d'un domaine ('nutrition', ...) sur une liste de recos, calculés au
+    premier accès ; pickle = (recos, domaine), les recos étant déjà dans le résultat.
+    """
+
+    __slots__ = ("_recs", "domain", "_items")
+
+    def __init__(self, recs: List[Dict], domain: str):
+        self._recs   = recs
+        self.domain  = domain
+        self._items: Optional[List[str]] = None
+
+    def _resolve(self) -> List[str]:
+        if self._items is None:
+            self._items = [v for r in self._recs
+                           for v in [_safe_str((r.get("recommendations") or {}).get(self.domain))] if v]
+        return self._items
+
+    def __getitem__(self, i):
+        return self._resolve()[i]
+
+    def __len__(self) -> int:
+        return len(self._resolve())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, DomainTexts)):
+            return self._resolve() == list(other)
+        return NotImplemented
+
+    def __reduce__(self):
+        return DomainTexts, (self._recs, self.domain)
+
+    def __repr__(self) -> str:
+        return repr(self._resolve())
+
+
+_TEXT_FIELDS = ("interpretation", "nutrition", "supplementation", "lifestyle", "monitoring")
+_TEXT_FIELD_POS = {f: i for i, f in enumerate(_TEXT_FIELDS)}
+
+
+class _MappedTexts(Mapping):
+    """Textes d'une règle dans un règlement colonnaire : indices de chaînes, décodage à l'accès."""
+
+    __slots__ = ("_strings", "_ids")
+
+    def __init__(self, strings: "rules_columnar.MappedStrings", ids: np.ndarray):
+        self._strings = strings
+        self._ids     = ids
+
+    def __getitem__(self, k: str) -> str:
+        return self._strings[int(self._ids[_TEXT_FIELD_POS[k]])]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_TEXT_FIELDS)
+
+    def __len__(self) -> int:
+        return len(_TEXT_FIELDS)
+
+
+def _intern_rule_text(table: _RuleTextTable, rule_id: str, texts: Mapping) -> RuleText:
+    table[rule_id] = texts
+    return RuleText(rule_id, table=table)
+
+
+class _NameIndex:
+    """
+    Index des noms normalisés de règles pour le matching patient -> règle.
+    resolve(nom) -> (ids exacts, ids liés par sous-chaîne dans un sens ou l'autre, triés),
+    mémoïsé par libellé distinct.
+    """
+
+    _SEP = "\x00"
+    _MEMO_MAX = 50_000
+
+    def __init__(self, keys: List[str]):
+        self.keys = list(keys)
+        self._exact: Dict[str, List[int]] = {}
+        for i, k in enumerate(self.keys):
+            self._exact.setdefault(k, []).append(i)
+        self._lengths = sorted({len(k) for k in self._exact if k})
+        self._empty   = tuple(self._exact.get("", ()))
+        # Clés concaténées : 'nom in clé' = un seul str.find sur un buffer
+        self._haystack = self._SEP.join(self.keys)
+        self._starts: List[int] = []
+        pos = 0
+        for k in self.keys:
+            self._starts.append(pos); pos += len(k) + 1
+        self._memo: Dict[str, Tuple[Tuple[int, ...], Tuple[int, ...]]] = {}
+
+    def resolve(self, name: str) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        hit = self._memo.get(name)
+        if hit is None:
+            if len(self._memo) >= self._MEMO_MAX:
+                self._memo.clear()
+            hit = self._memo[name] = self._resolve(name)
+        return hit
+
+    def _resolve(self, name: str) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        exact = tuple(self._exact.get(name, ()))
+        if not name:
+            return exact, tuple(range(len(self.keys)))
+
+        related = set(self._empty)
+        # clé in nom : sous-chaînes du nom aux seules longueurs présentes dans l'index
+        n = len(name)
+        for L in self._lengths:
+            if L > n: break
+            for a in range(n - L + 1):
+                ids = self._exact.get(name[a:a + L])
+                if ids: related.update(ids)
+        # nom in clé
+        pos = self._haystack.find(name)
+        while pos != -1:
+            i = bisect_right(self._starts, pos) - 1
+            related.add(i)
+            nxt = i + 1
+            if nxt >= len(self._starts): break
+            pos = self._haystack.find(name, self._starts[nxt])
+        return exact, tuple(sorted(related))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Axes thérapeutiques
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Ordre = priorité : une reco va au premier axe dont un mot-clé apparaît
+_AXIS_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "metabolisme":      ("metabol","glyc","insuline","glucose","lipide","trigly","homa"),
+    "inflammation":     ("inflamm","crp","cytokine","oxydatif","ferritine","fibrinogene","calprotect"),
+    "hormones":         ("hormone","thyroid","cortisol","testosteron","oestrog","dhea","tsh"),
+    "micronutrition":   ("vitamine","mineral","magnesium","zinc","omega","selenium","b12","folate","coenzyme","carnitine"),
+    "microbiome":       ("bacterie","firmicute","bacteroidote","lactobacil","bifidobacter","akkermansia",
+                         "faecalibacterium","commensals","cross feeder","inflammatory","opportunistic",
+                         "microbiome","microbiote","fecal"),
+    "cardiovasculaire": ("cardio","cholesterol","hdl","ldl","triglycer","homocysteine","apob","apoa"),
+}
+_AXES = (*_AXIS_KEYWORDS, "autre")
+
+# Un seul automate : lookahead testé à chaque position, alternatives dans l'ordre des axes
+# -> à une position donnée le groupe nommé trouvé est l'axe le plus prioritaire qui y commence
+_AXIS_RE = re.compile("(?=" + "|".join(
+    f"(?P<{axis}>{'|'.join(map(re.escape, kws))})" for axis, kws in _AXIS_KEYWORDS.items()
+) + ")")
+_AXIS_RANK = {axis: i for i, axis in enumerate(_AXES)}
+
+_axis_memo: Dict[Tuple[str, str], str] = {}
+_AXIS_MEMO_MAX = 50_000
+
+
+def _classify_axis(text: str) -> str:
+    best = len(_AXES) - 1
+    for m in _AXIS_RE.finditer(text):
+        rank = _AXIS_RANK[m.lastgroup]
+        if rank < best:
+            best = rank
+            if not best: break
+    return _AXES[best]
+
+
+def _rec_axis(rec: Dict) -> str:
+    """
+    Axe thérapeutique d'une reco, mémoïsé par (catégorie, biomarqueur) : le titre ne fait que
+    reprendre le biomarqueur (+ 'bas'/'eleve' ou une parenthèse retirée à la normalisation).
+    """
+    ck = (rec.get("category", ""), rec.get("biomarker", ""))
+    axis = _axis_memo.get(ck)
+    if axis is None:
+        if len(_axis_memo) >= _AXIS_MEMO_MAX:
+            _axis_memo.clear()
+        text = " ".join(_normalize(x) for x in (ck[0], rec.get("title", ""), ck[1]))
+        axis = _axis_memo[ck] = _classify_axis(text)
+    return axis
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Instrumentation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _echo(msg: str):
+    if VERBOSE:
+        print(msg)
+
+
+class RulesMetrics:
+    """
+    Registre process-wide des métriques du moteur (thread-safe) :
+    par étape (feuille bio, microbiote, lot BATCH:<feuille>) nombre d'appels, temps
+    cumulé/max, matches et déclenchements ; compteur de déclenchements par règle
+    (feuille, clé normalisée de la règle, direction), le même quel que soit le chemin.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages:    Dict[str, Dict[str, float]] = {}
+            self._rule_hits: Dict[Tuple[str, str, str], int] = {}
+
+    def record_stage(
+        self,
+        stage: str,
+        seconds: float,
+        matched: int,
+        triggered: int,
+        hits: List[Tuple[str, str]],
+        sheet: Optional[str] = None,
+    ):
+        """hits : (clé de règle, direction) ; comptés sous `sheet` (défaut : l'étape)."""
+        sheet = sheet or stage
+        with self._lock:
+            st = self._stages.get(stage)
+            if st is None:
+                st = self._stages[stage] = {
+                    "calls": 0, "seconds_total": 0.0, "seconds_max": 0.0, "matched": 0, "triggered": 0,
+                }
+            st["calls"]         += 1
+            st["seconds_total"] += seconds
+            st["seconds_max"]    = max(st["seconds_max"], seconds)
+            st["matched"]       += matched
+            st["triggered"]     += triggered
+            for rule, direction in hits:
+                k = (sheet, rule, direction)
+                self._rule_hits[k] = self._rule_hits.get(k, 0) + 1
+
+    def rule_hits(self) -> Dict[Tuple[str, str, str], int]:
+        with self._lock:
+            return dict(self._rule_hits)
+
+    def export(self) -> Dict[str, Any]:
+        """Instantané sérialisable (JSON) des métriques."""
+        with self._lock:
+            stages = {
+                k: {**v, "seconds_mean": v["seconds_total"] / v["calls"] if v["calls"] else 0.0}
+                for k, v in self._stages.items()
+            }
+            hits = [
+                {"sheet": sh, "rule": rule, "direction": d, "hits": n}
+                for (sh, rule, d), n in sorted(self._rule_hits.items(), key=lambda kv: -kv[1])
+            ]
+        return {"stages": stages, "rule_hits": hits, "normalization": normalization_stats()}
+
+
+METRICS = RulesMetrics()
+
+
+@dataclass
+class EvaluationTrace:
+    """
+    Trace d'un appel d'évaluation. Créée par appel et retournée à l'appelant :
+    le moteur ne garde aucun état par évaluation, une instance compilée peut donc
+    servir plusieurs threads en parallèle.
+    """
+    rulebook_version: str = ""
+    lines:            List[str] = field(default_factory=list)
+    stages:           List[Dict[str, Any]] = field(default_factory=list)
+
+    def log(self, msg: str):
+        self.lines.append(msg)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Moteur de règles
 # ─────────────────────────────────────────────────────────────────────────────
@@ -92,16 +610,73 @@ class RulesEngine:
         "functional": ["FONCTIONNEL_134", "Bio_Functional", "bio_functional", "Fonctionnel"],
     }
     _MICRO_SHEETS = ["Microbiote", "Microbiome", "microbiome", "Micro"]
+    # Attributs du règlement compilé, persistés dans le cache disque
+    _COMPILED_ATTRS = (
+        "_df_base", "_df_extended", "_df_functional", "_df_micro",
+        "_bio_rules", "_bio_index", "_micro_names", "_micro_rules",
+    )
+    # Libellé de feuille -> DataFrame source (diagnostics, rapports de colonnes)
+    _SHEET_ATTRS = {
+        "BASE": "_df_base", "EXTENDED": "_df_extended",
+        "FONCTIONNEL": "_df_functional", "MICROBIOME": "_df_micro",
+    }
+    # Ligne des tableaux de bornes par sexe (cf. _get_bio_bounds)
+    _SEX_ROWS = {"H": 0, "F": 1}
+    # (feuille compilée, priorité, libellé log) - ordre d'évaluation
+    _BIO_PASSES = [
+        ("base",       "HIGH",   "BASE"),
+        ("extended",   "HIGH",   "EXTENDED"),
+        ("functional", "MEDIUM", "FONCTIONNEL"),
+    ]
+
+    def __init__(
+        self,
+        rules_excel_path: str,
+        cache_dir: Optional[str] = None,
+        use_cache: bool = True,
+        columnar: bool = False,
+    ):
+        """
+        cache_dir : dossier du cache compilé (défaut : $ALGOLIFE_RULES_CACHE_DIR,
+                    sinon '.rules_cache' à côté du classeur) ; use_cache=False le désactive.
+        columnar  : règlement servi depuis le fichier colonnaire du cache (créé au besoin),
+                    mappé en lecture seule -> mémoire partagée entre process.
+        """
+        self._init_state(rules_excel_path, cache_dir, use_cache, columnar)
+        self._load_rules()
+
+    @classmethod
+    def from_columnar(cls, path: str) -> "RulesEngine":
+        """Moteur servi directement par un fichier colonnaire (sans le classeur Excel)."""
+        engine = cls.__new__(cls)
+        engine._init_state("", None, False, True)
+        engine._map_columnar(path)
+        return engine
 
-    def __init__(self, rules_excel_path: str):
+    def _init_state(self, rules_excel_path: str, cache_dir: Optional[str], use_cache: bool, columnar: bool):
         self.rules_excel_path = rules_excel_path
+        self.cache_dir = cache_dir or os.getenv("ALGOLIFE_RULES_CACHE_DIR") or os.path.join(
+            os.path.dirname(os.path.abspath(rules_excel_path)), ".rules_cache"
+        )
+        self.use_cache = use_cache
+        self.columnar  = columnar
+        self.rulebook_hash = ""
+        self.rulebook_version = ""
         self._df_base:       Optional[pd.DataFrame] = None
         self._df_extended:   Optional[pd.DataFrame] = None
         self._df_functional: Optional[pd.DataFrame] = None
         self._df_micro:      Optional[pd.DataFrame] = None
-        self._micro_index:   Dict[str, pd.DataFrame] = {}
-        self.debug_log:      List[str] = []
-        self._load_rules()
+        self._bio_rules:     Dict[str, List[_BioRule]] = {}
+        self._bio_index:     Dict[str, _NameIndex] = {}
+        self._micro_names:   _NameIndex = _NameIndex([])
+        self._micro_rules:   Dict[str, _MicroMarker] = {}
+        self._stool_memo:    Dict[Tuple[str, str], Tuple[Optional[str], Optional[_MicroRule]]] = {}
+        self._bio_bounds:    Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._diag_tables:   Dict[str, Tuple[_NameIndex, List[Tuple[str, Dict]]]] = {}
+        self._mapped:        Optional[rules_columnar.MappedFile] = None
+        self._rule_texts:    Optional[_RuleTextTable] = None   # textes de la version chargée
+        self.debug_log:      List[str] = []   # journal de chargement uniquement (cf. EvaluationTrace)
+        self.record_metrics: bool = True      # False : évaluations absentes de METRICS
 
     # ── Chargement ──────────────────────────────────────────────────────────
 
@@ -109,143 +684,453 @@ class RulesEngine:
         if not os.path.exists(self.rules_excel_path):
             raise FileNotFoundError(f"Fichier introuvable : {self.rules_excel_path}")
 
-        xl = pd.ExcelFile(self.rules_excel_path)
-        available = xl.sheet_names
-        msg = f"Feuilles disponibles : {available}"
-        print(msg); self.debug_log.append(msg)
+        with open(self.rules_excel_path, "rb") as f:
+            data = f.read()
+        self.rulebook_hash = hashlib.sha256(data).hexdigest()
+        self.rulebook_version = self.rulebook_hash[:12]
+
+        if self.columnar:
+            path = self._cache_path(".alrb")
+            if os.path.exists(path) and self._try_map_columnar(path):
+                return
+        if not (self.use_cache and self._load_cache()):
+            self._parse_workbook(data)
+            if self.use_cache:
+                self._save_cache()
+        self._intern_texts()
+        self._precompute_bounds()
+        if self.columnar:
+            # Export puis mapping : même état en mémoire que pour les process suivants.
+            # Cache non inscriptible -> moteur compilé en mémoire, comme _save_cache
+            try:
+                self.export_columnar(path)
+            except Exception as e:
+                msg = f"  ATTENTION: reglement colonnaire non ecrit ({e}), regles servies en memoire"
+                _echo(msg); self.debug_log.append(msg)
+            else:
+                self._try_map_columnar(path)
+
+    def _intern_texts(self):
+        """Enregistre les textes de chaque règle (id stable : version du classeur + position)."""
+        v = self.rulebook_version
+        table = self._rule_texts = _rule_text_table(v)
+        for key, rules in self._bio_rules.items():
+            for i, rule in enumerate(rules):
+                rule.payload = {
+                    d: _intern_rule_text(table, f"{v}:{key}:{i}:{d}", {**rule.recs[d], "monitoring": ""})
+                    for d in _DIRECTIONS
+                }
+        for mkey, marker in self._micro_rules.items():
+            for j, (_, _, rule) in enumerate(marker.rows):
+                rule.payload = _intern_rule_text(table, f"{v}:micro:{mkey}:{j}", rule.recs)
+
+    def _cache_path(self, ext: str = ".pkl") -> str:
+        stem = os.path.splitext(os.path.basename(self.rules_excel_path))[0]
+        return os.path.join(
+            self.cache_dir,
+            f"{stem}-{self.rulebook_hash[:16]}-v{ENGINE_VERSION}-f{_COMPILED_FORMAT}{ext}",
+        )
 
-        for key, attr in [
-            ("base", "_df_base"), ("extended", "_df_extended"), ("functional", "_df_functional")
-        ]:
-            for name in self._BIO_SHEETS[key]:
+    def prune_cache(self) -> List[str]:
+        """
+        Supprime du cache les fichiers compilés (.pkl / .alrb) de ce classeur qui ne
+        correspondent plus à la version chargée. Retourne les chemins supprimés.
+        Un fichier encore mappé par un autre process reste lisible par lui (POSIX).
+        """
+        stem = os.path.splitext(os.path.basename(self.rules_excel_path))[0]
+        pattern = re.compile(re.escape(stem) + r"-[0-9a-f]{16}-v.+-f\d+\.(?:pkl|alrb)$")
+        keep = {os.path.basename(self._cache_path(ext)) for ext in (".pkl", ".alrb")}
+        removed = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return removed
+        for name in names:
+            if name in keep or not pattern.match(name):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            removed.append(path)
+        if removed:
+            msg = f"Cache regles : {len(removed)} fichier(s) obsolete(s) supprime(s)"
+            _echo(msg); self.debug_log.append(msg)
+        return removed
+
+    def _load_cache(self) -> bool:
+        path = self._cache_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("hash") != self.rulebook_hash:
+                return False
+            for attr in self._COMPILED_ATTRS:
+                setattr(self, attr, state[attr])
+        except Exception as e:
+            msg = f"  ATTENTION: cache regles illisible ({e}), relecture Excel"
+            _echo(msg); self.debug_log.append(msg)
+            return False
+        msg = f"Regles chargees depuis le cache : {path}"
+        _echo(msg); self.debug_log.append(msg)
+        return True
+
+    def _save_cache(self):
+        path = self._cache_path()
+        state = {"hash": self.rulebook_hash, **{a: getattr(self, a) for a in self._COMPILED_ATTRS}}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Écriture atomique : fichier temporaire puis rename
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except Exception as e:
+            msg = f"  ATTENTION: cache regles non ecrit ({e})"
+            _echo(msg); self.debug_log.append(msg)
+
+    def _parse_workbook(self, data: bytes):
+        """
+        Lecture en une passe : le classeur (déjà en mémoire pour le hash) est ouvert une
+        seule fois en lecture seule (openpyxl read_only via pandas) et seules les feuilles
+        retenues sont parsées, chacune une fois.
+        """
+        with pd.ExcelFile(io.BytesIO(data), engine="openpyxl") as xl:
+            available = xl.sheet_names
+            msg = f"Feuilles disponibles : {available}"
+            _echo(msg); self.debug_log.append(msg)
+
+            for key, attr in [
+                ("base", "_df_base"), ("extended", "_df_extended"), ("functional", "_df_functional")
+            ]:
+                for name in self._BIO_SHEETS[key]:
+                    if name in available:
+                        df = xl.parse(name)
+                        setattr(self, attr, df)
+                        self._bio_rules[key] = _compile_bio_sheet(df)
+                        self._bio_index[key] = _NameIndex([r.key for r in self._bio_rules[key]])
+                        msg = f"  OK '{name}' -> {len(df)} regles bio ({key})"
+                        _echo(msg); self.debug_log.append(msg)
+                        break
+                else:
+                    msg = f"  ATTENTION: feuille bio '{key}' non trouvee"
+                    _echo(msg); self.debug_log.append(msg)
+
+            for name in self._MICRO_SHEETS:
                 if name in available:
-                    df = pd.read_excel(self.rules_excel_path, sheet_name=name)
-                    setattr(self, attr, df)
-                    msg = f"  OK '{name}' -> {len(df)} regles bio ({key})"
-                    print(msg); self.debug_log.append(msg)
+                    df = xl.parse(name)
+                    self._df_micro = df
+                    # Règles par marqueur bacterien (normalise) pour lookup O(1)
+                    for bm, grp in df.groupby("Marqueur_bacterien"):
+                        self._micro_rules[_normalize(str(bm))] = _compile_micro_marker(grp)
+                    self._micro_names = _NameIndex(list(self._micro_rules))
+                    msg = f"  OK '{name}' -> {len(df)} regles microbiote | {len(self._micro_rules)} marqueurs indexes"
+                    _echo(msg); self.debug_log.append(msg)
                     break
-            else:
-                msg = f"  ATTENTION: feuille bio '{key}' non trouvee"
-                print(msg); self.debug_log.append(msg)
-
-        for name in self._MICRO_SHEETS:
-            if name in available:
-                df = pd.read_excel(self.rules_excel_path, sheet_name=name)
-                self._df_micro = df
-                # Index par marqueur bacterien (normalise) pour lookup O(1)
-                for bm, grp in df.groupby("Marqueur_bacterien"):
-                    self._micro_index[_normalize(str(bm))] = grp.copy()
-                msg = f"  OK '{name}' -> {len(df)} regles microbiote | {len(self._micro_index)} marqueurs indexes"
-                print(msg); self.debug_log.append(msg)
-                break
+
+    # ── Format colonnaire ───────────────────────────────────────────────────
+
+    def _sheet_meta(self) -> Dict[str, Optional[Tuple[int, List[str]]]]:
+        """Libellé de feuille -> (nb lignes, colonnes), None si la feuille est absente."""
+        if self._mapped is not None:
+            return {k: tuple(v) if v is not None else None for k, v in self._mapped.header["sheets"].items()}
+        return {
+            label: (len(df), [str(c) for c in df.columns]) if df is not None else None
+            for label, attr in self._SHEET_ATTRS.items()
+            for df in [getattr(self, attr)]
+        }
+
+    def export_columnar(self, path: Optional[str] = None) -> str:
+        """
+        Écrit le règlement compilé au format colonnaire (cf. rules_columnar) : règles bio
+        (noms, normes H/F, textes), règles microbiote (sélections pré-résolues), tables de
+        diagnostic et métadonnées des feuilles. Retourne le chemin écrit.
+        """
+        path = path or self._cache_path(".alrb")
+        st = rules_columnar.StringTable()
+        arrays: Dict[str, np.ndarray] = {}
+        nan = float("nan")
+        bound = lambda x: nan if x is None else x
+
+        for key, rules in self._bio_rules.items():
+            p = f"bio.{key}."
+            arrays[p + "name"]     = np.array([st.add(r.name) for r in rules], dtype=np.int32)
+            arrays[p + "key"]      = np.array([st.add(r.key) for r in rules], dtype=np.int32)
+            arrays[p + "category"] = np.array([st.add(r.category) for r in rules], dtype=np.int32)
+            arrays[p + "norm"]     = np.array([[st.add(r.norms[sk][0]) for sk in ("H", "F")] for r in rules],
+                                              dtype=np.int32).reshape(len(rules), 2)
+            arrays[p + "low"]      = np.array([[bound(r.norms[sk][1]) for sk in ("H", "F")] for r in rules],
+                                              dtype=np.float64).reshape(len(rules), 2)
+            arrays[p + "high"]     = np.array([[bound(r.norms[sk][2]) for sk in ("H", "F")] for r in rules],
+                                              dtype=np.float64).reshape(len(rules), 2)
+            arrays[p + "texts"]    = np.array(
+                [[[st.add(r.payload[d][f]) for f in _TEXT_FIELDS] for d in _DIRECTIONS] for r in rules],
+                dtype=np.int32,
+            ).reshape(len(rules), len(_DIRECTIONS), len(_TEXT_FIELDS))
+
+        markers = list(self._micro_rules.items())
+        rows, row_start, pos = [], [0], {}
+        for _, marker in markers:
+            for row in marker.rows:
+                pos[id(row[2])] = len(rows)
+                rows.append(row)
+            row_start.append(len(rows))
+        ref = lambda rule: -1 if rule is None else pos[id(rule)]
+        arrays["micro.key"]       = np.array([st.add(k) for k, _ in markers], dtype=np.int32)
+        arrays["micro.row_start"] = np.array(row_start, dtype=np.int32)
+        arrays["micro.flags"]     = np.array([[e, r] for e, r, _ in rows], dtype=np.bool_).reshape(len(rows), 2)
+        arrays["micro.category"]  = np.array([st.add(rule.category) for _, _, rule in rows], dtype=np.int32)
+        arrays["micro.gravite"]   = np.array([rule.gravite for _, _, rule in rows], dtype=np.int32)
+        arrays["micro.texts"]     = np.array(
+            [[st.add(rule.payload[f]) for f in _TEXT_FIELDS] for _, _, rule in rows], dtype=np.int32
+        ).reshape(len(rows), len(_TEXT_FIELDS))
+        arrays["micro.table"]     = np.array(
+            [[[ref(m.table.get((elev, lvl))) for lvl in (1, 2, 3)] for elev in (True, False)] for _, m in markers],
+            dtype=np.int32,
+        ).reshape(len(markers), 2, 3)
+        arrays["micro.stool"]     = np.array(
+            [[ref(m.stool[k]) for k in ("pos", "neg", "any")] for _, m in markers], dtype=np.int32
+        ).reshape(len(markers), 3)
+
+        for label in ("BASE", "EXTENDED", "FONCTIONNEL"):
+            table = self._diag_table(label)
+            if table is None:
+                continue
+            diag = table[1]
+            p = f"diag.{label}."
+            arrays[p + "name"] = np.array([st.add(br) for br, _ in diag], dtype=np.int32)
+            arrays[p + "norm"] = np.array([[st.add(n[c][0]) for c in self._DIAG_NORM_COLS] for _, n in diag],
+                                          dtype=np.int32).reshape(len(diag), 2)
+            arrays[p + "low"]  = np.array([[bound(n[c][1][0]) for c in self._DIAG_NORM_COLS] for _, n in diag],
+                                          dtype=np.float64).reshape(len(diag), 2)
+            arrays[p + "high"] = np.array([[bound(n[c][1][1]) for c in self._DIAG_NORM_COLS] for _, n in diag],
+                                          dtype=np.float64).reshape(len(diag), 2)
+
+        header = {
+            "engine_version":   ENGINE_VERSION,
+            "compiled_format":  _COMPILED_FORMAT,
+            "rulebook_hash":    self.rulebook_hash,
+            "rulebook_version": self.rulebook_version,
+            "bio_sheets":       list(self._bio_rules),
+            "sheets":           self._sheet_meta(),
+        }
+        rules_columnar.write(path, header, arrays, st)
+        msg = f"Reglement colonnaire ecrit : {path}"
+        _echo(msg); self.debug_log.append(msg)
+        return path
+
+    def _try_map_columnar(self, path: str) -> bool:
+        try:
+            self._map_columnar(path, expected_hash=self.rulebook_hash)
+        except Exception as e:
+            msg = f"  ATTENTION: reglement colonnaire inutilisable ({e})"
+            _echo(msg); self.debug_log.append(msg)
+            return False
+        return True
+
+    def _map_columnar(self, path: str, expected_hash: Optional[str] = None):
+        """Remplace les structures compilées par celles du fichier mappé (DataFrames libérés)."""
+        mf = rules_columnar.MappedFile(path)
+        h = mf.header
+        if (h.get("engine_version"), h.get("compiled_format")) != (ENGINE_VERSION, _COMPILED_FORMAT):
+            raise ValueError(f"version {h.get('engine_version')}/f{h.get('compiled_format')}")
+        if expected_hash is not None and h.get("rulebook_hash") != expected_hash:
+            raise ValueError("classeur different")
+
+        strings = mf.strings
+        text_table = _rule_text_table(h["rulebook_version"])
+        opt = lambda x: None if np.isnan(x) else float(x)
+        bio_rules: Dict[str, List[_BioRule]] = {}
+        for key in h["bio_sheets"]:
+            p = f"bio.{key}."
+            names, keys, cats = mf.array(p + "name"), mf.array(p + "key"), mf.array(p + "category")
+            norm, low, high = mf.array(p + "norm"), mf.array(p + "low"), mf.array(p + "high")
+            texts = mf.array(p + "texts")
+            rules = []
+            for i in range(len(names)):
+                rules.append(_BioRule(
+                    name=strings[names[i]],
+                    key=strings[keys[i]],
+                    category=strings[cats[i]],
+                    norms={sk: (strings[norm[i, j]], opt(low[i, j]), opt(high[i, j]))
+                           for j, sk in enumerate(("H", "F"))},
+                    recs={},
+                    payload={d: _intern_rule_text(text_table, f"{h['rulebook_version']}:{key}:{i}:{d}",
+                                                  _MappedTexts(strings, texts[i, j]))
+                             for j, d in enumerate(_DIRECTIONS)},
+                ))
+            bio_rules[key] = rules
+
+        micro_rules: Dict[str, _MicroMarker] = {}
+        flags, cats, grav, texts = (mf.array("micro.flags"), mf.array("micro.category"),
+                                    mf.array("micro.gravite"), mf.array("micro.texts"))
+        row_start, table, stool = mf.array("micro.row_start"), mf.array("micro.table"), mf.array("micro.stool")
+        all_rows: List[_MicroRule] = []
+        for m, sid in enumerate(mf.array("micro.key")):
+            mkey = strings[sid]
+            rows = []
+            for j, r in enumerate(range(row_start[m], row_start[m + 1])):
+                rule = _MicroRule(
+                    category=strings[cats[r]], gravite=int(grav[r]), recs={},
+                    payload=_intern_rule_text(text_table, f"{h['rulebook_version']}:micro:{mkey}:{j}",
+                                              _MappedTexts(strings, texts[r])),
+                )
+                all_rows.append(rule)
+                rows.append((bool(flags[r, 0]), bool(flags[r, 1]), rule))
+            pick = lambda r: None if r < 0 else all_rows[r]
+            micro_rules[mkey] = _MicroMarker(
+                rows=rows,
+                table={(elev, lvl): pick(table[m, e, lvl - 1])
+                       for e, elev in enumerate((True, False)) for lvl in (1, 2, 3)},
+                stool={k: pick(stool[m, i]) for i, k in enumerate(("pos", "neg", "any"))},
+            )
+
+        for attr in self._SHEET_ATTRS.values():
+            setattr(self, attr, None)
+        self._mapped           = mf
+        self._rule_texts       = text_table
+        self.rulebook_hash     = h["rulebook_hash"]
+        self.rulebook_version  = h["rulebook_version"]
+        self._bio_rules        = bio_rules
+        self._bio_index        = {k: _NameIndex([r.key for r in rules]) for k, rules in bio_rules.items()}
+        self._micro_rules      = micro_rules
+        self._micro_names      = _NameIndex(list(micro_rules))
+        self._stool_memo       = {}
+        # Bornes H/F lues telles quelles dans le fichier (n, 2) -> vues (2, n) sans copie
+        self._bio_bounds       = {
+            key: (mf.array(f"bio.{key}.low").T, mf.array(f"bio.{key}.high").T) for key in bio_rules
+        }
+        self._diag_tables      = {}
+        msg = f"Regles mappees depuis le fichier colonnaire : {path}"
+        _echo(msg); self.debug_log.append(msg)
 
     # ── Application règles bio ───────────────────────────────────────────────
 
-    def _apply_bio_sheet(
+    def _iter_bio_sheet(
         self,
-        df: Optional[pd.DataFrame],
+        key: str,
         bio_data: Dict[str, float],
         sex: str,
         priority: str,
-        label: str = "",
-    ) -> List[Dict]:
-        results = []
-        if df is None or df.empty:
-            return results
+        label: str,
+        trace: EvaluationTrace,
+    ) -> Iterator[Dict]:
+        """
+        Recos d'une feuille bio, produites règle par règle (log / métriques en fin de feuille).
+        Le temps enregistré est celui du moteur seul : l'horloge est suspendue pendant les yield.
+        """
+        elapsed = 0.0
+        t0 = time.perf_counter()
+        rules = self._bio_rules.get(key)
+        if not rules:
+            return
+
+        bio_norm = self._patient_index(bio_data)
+        assigned = self._assign_bio(key, bio_norm)
+        sk = _sex_key(sex)
+
+        hits: List[Tuple[str, str]] = []
+        for i in sorted(assigned):
+            rec = self._eval_bio_rule(rules[i], sk, priority, bio_norm[assigned[i]][1])
+            if rec is not None:
+                hits.append((rules[i].key, rec["direction"]))
+                elapsed += time.perf_counter() - t0
+                yield rec
+                t0 = time.perf_counter()
+        matched   = len(assigned)
+        triggered = len(hits)
 
-        # Index patient normalise
+        msg = f"  [{label}] {len(bio_data)} bm | {matched} matches | {triggered} declenches"
+        _echo(msg); trace.log(msg)
+        elapsed += time.perf_counter() - t0
+        self._record_stage(trace, label, elapsed, matched, triggered, hits)
+
+    def _record_stage(
+        self,
+        trace: EvaluationTrace,
+        stage: str,
+        elapsed: float,
+        matched: int,
+        triggered: int,
+        hits: List[Tuple[str, str]],
+    ):
+        trace.stages.append({"stage": stage, "seconds": elapsed, "matched": matched, "triggered": triggered})
+        if self.record_metrics:
+            METRICS.record_stage(stage, elapsed, matched, triggered, hits)
+
+    @staticmethod
+    def _patient_index(bio_data: Dict[str, float]) -> Dict[str, Tuple[str, float]]:
+        """Index patient normalise {nom normalisé: (libellé, valeur)} ; valeurs None ignorées."""
         bio_norm: Dict[str, Tuple[str, float]] = {}
         for k, v in bio_data.items():
             if v is not None:
                 bio_norm[_normalize(k)] = (k, float(v))
+        return bio_norm
 
-        # Colonne norme - noms CONFIRMES dans le fichier Excel
-        norm_col = "Normes H" if str(sex).upper() in ("H", "M") else "Normes F"
-        if norm_col not in df.columns:
-            for c in df.columns:
-                if "norme" in c.lower():
-                    norm_col = c; break
-
-        matched = 0
-        triggered = 0
-
-        for _, row in df.iterrows():
-            bm_raw = _safe_str(row.get("Biomarqueur", ""))
-            if not bm_raw:
-                continue
-
-            bm_norm = _normalize(bm_raw)
-
-            # Matching patient -> regle
-            patient_orig = None
-            patient_val  = None
-
-            if bm_norm in bio_norm:
-                patient_orig, patient_val = bio_norm[bm_norm]
-            else:
-                for kn, (k_orig, v) in bio_norm.items():
-                    if bm_norm in kn or kn in bm_norm:
-                        patient_orig, patient_val = k_orig, v
-                        break
-
-            if patient_val is None:
-                continue
-            matched += 1
-
-            norm_raw = row.get(norm_col)
-            if _safe_str(norm_raw) == "" and norm_col != "Normes H":
-                norm_raw = row.get("Normes H")
-
-            low, high = _parse_norm(norm_raw)
-            if low is None and high is None:
-                continue
-
-            is_low  = (low  is not None) and (patient_val < low)
-            is_high = (high is not None) and (patient_val > high)
-            if not is_low and not is_high:
-                continue
-            triggered += 1
-
-            d = "BASSE" if is_low else "HAUTE"
-
-            # Colonnes recs - noms CONFIRMES dans le fichier Excel
-            results.append({
-                "rule_type":   "bio",
-                "priority":    priority,
-                "category":    _safe_str(row.get("Categorie", row.get("Catégorie", "Biologie"))),
-                "title":       f"{bm_raw} {'bas' if is_low else 'eleve'}",
-                "biomarker":   bm_raw,
-                "value":       patient_val,
-                "direction":   d,
-                "norm":        _safe_str(norm_raw),
-                "recommendations": {
-                    "interpretation": _safe_str(row.get(f"{d} - Interprétation", "")),
-                    "nutrition":      _safe_str(row.get(f"{d} - Nutrition", "")),
-                    "supplementation":_safe_str(row.get(f"{d} - Micronutrition", "")),
-                    "lifestyle":      _safe_str(row.get(f"{d} - Lifestyle", "")),
-                    "monitoring":     "",
-                },
-            })
-
-        msg = f"  [{label}] {len(bio_data)} bm | {matched} matches | {triggered} declenches"
-        print(msg); self.debug_log.append(msg)
-        return results
+    def _assign_bio(self, key: str, bio_norm: Dict[str, Tuple[str, float]]) -> Dict[int, str]:
+        """
+        Matching patient -> regle {id règle: nom patient normalisé} : nom exact d'abord,
+        sinon premier biomarqueur patient (ordre d'entrée) lié par sous-chaîne.
+        """
+        index = self._bio_index[key]
+        assigned: Dict[int, str] = {}
+        for kn in bio_norm:
+            for i in index.resolve(kn)[0]:
+                assigned[i] = kn
+        for kn in bio_norm:
+            for i in index.resolve(kn)[1]:
+                assigned.setdefault(i, kn)
+        return assigned
+
+    def _eval_bio_rule(self, rule: _BioRule, sk: str, priority: str, value: float) -> Optional[Dict]:
+        norm_txt, low, high = rule.norms[sk]
+        if low is None and high is None:
+            return None
+        is_low  = (low  is not None) and (value < low)
+        is_high = (high is not None) and (value > high)
+        if not is_low and not is_high:
+            return None
+        return self._bio_rec(rule, priority, value, is_low, norm_txt)
+
+    @staticmethod
+    def _bio_rec(rule: _BioRule, priority: str, value: float, is_low: bool, norm_txt: str) -> Dict:
+        d = "BASSE" if is_low else "HAUTE"
+        return {
+            "rule_type":   "bio",
+            "priority":    priority,
+            "category":    rule.category,
+            "title":       f"{rule.name} {'bas' if is_low else 'eleve'}",
+            "biomarker":   rule.name,
+            "value":       value,
+            "direction":   d,
+            "norm":        norm_txt,
+            "recommendations": rule.payload[d],
+        }
 
     # ── Application règles microbiome ────────────────────────────────────────
 
-    def _apply_micro_rules(self, microbiome_data: Dict) -> List[Dict]:
+    def _apply_micro_rules(self, microbiome_data: Dict, trace: EvaluationTrace) -> List[Dict]:
+        return list(self._iter_micro_rules(microbiome_data, trace))
+
+    def _iter_micro_rules(self, microbiome_data: Dict, trace: EvaluationTrace) -> Iterator[Dict]:
         """
         Utilise bacteria_individual (48 bactéries nominales, clé abundance_level).
         Fallback : bacteria_groups si bacteria_individual absent.
         Traite aussi stool_biomarkers (calprotectine, sIgA, histamine...).
+        Comme pour les feuilles bio, le temps passé chez le consommateur n'est pas compté.
         """
-        results = []
-        if not self._micro_index:
-            self.debug_log.append("  ATTENTION: index microbiote vide")
-            return results
+        elapsed = 0.0
+        t0 = time.perf_counter()
+        if not self._micro_rules:
+            trace.log("  ATTENTION: index microbiote vide")
+            return
 
         if not isinstance(microbiome_data, dict):
-            return results
+            return
 
         # ── Source 1 : bacteria_individual ───────────────────────────────────
         bacteria = microbiome_data.get("bacteria_individual", [])
@@ -281,7 +1166,9 @@ class RulesEngine:
                     })
             bacteria = converted
 
+        matched = 0
         triggered = 0
+        hits: List[Tuple[str, str]] = []
 
         for bact in bacteria:
             abundance_level = bact.get("abundance_level", 0)
@@ -299,68 +1186,45 @@ class RulesEngine:
             abs_level   = abs(abundance_level)  # 1, 2 ou 3
 
             # Chercher dans l'index
-            rules_df = None
-            if bact_norm in self._micro_index:
-                rules_df = self._micro_index[bact_norm]
-            else:
-                for rk, rdf in self._micro_index.items():
-                    if bact_norm in rk or rk in bact_norm:
-                        rules_df = rdf; break
+            marker = None
+            exact, related = self._micro_names.resolve(bact_norm)
+            if exact or related:
+                marker = self._micro_rules[self._micro_names.keys[(exact or related)[0]]]
 
-            if rules_df is None:
-                self.debug_log.append(f"    MICRO no rule: '{bact_name}'")
+            if marker is None:
+                trace.log(f"    MICRO no rule: '{bact_name}'")
                 continue
+            matched += 1
+            marker_key = self._micro_names.keys[(exact or related)[0]]
 
-            # Sélectionner la meilleure règle : direction + niveau
-            best_row   = None
-            best_score = -1
-
-            for _, rr in rules_df.iterrows():
-                cond    = _safe_str(rr.get("Condition_declenchement", "")).lower()
-                gravite = _parse_gravite(rr.get("Niveau_gravite"))
-
-                # Direction
-                is_elev_rule = ("lev" in cond) or (gravite > 0)   # Élévation
-                is_redu_rule = ("duc" in cond) or (gravite < 0)    # Réduction
-
-                if is_elevated and not is_elev_rule: continue
-                if not is_elevated and not is_redu_rule: continue
-
-                # Niveau (correspondance exacte = max points)
-                rule_abs = abs(gravite) if gravite != 0 else 1
-                score = 10 if rule_abs == abs_level else (5 - abs(rule_abs - abs_level))
-
-                if score > best_score:
-                    best_score, best_row = score, rr
+            # Règle pré-sélectionnée (direction + niveau) ; niveau hors 1..3 -> sélection à la volée
+            sel = (is_elevated, abs_level)
+            best = marker.table[sel] if sel in marker.table else _select_micro_rule(marker.rows, *sel)
 
-            if best_row is None:
-                self.debug_log.append(
+            if best is None:
+                trace.log(
                     f"    MICRO no match rule: '{bact_name}' lvl={abundance_level:+d}"
                 )
                 continue
 
             triggered += 1
-            g     = _parse_gravite(best_row.get("Niveau_gravite"))
-            abs_g = abs(g)
+            hits.append((marker_key, "HAUTE" if is_elevated else "BASSE"))
+            abs_g = abs(best.gravite)
             prio  = "HIGH" if abs_g >= 3 else ("MEDIUM" if abs_g == 2 else "LOW")
 
-            results.append({
+            elapsed += time.perf_counter() - t0
+            yield {
                 "rule_type":   "microbiome",
                 "priority":    prio,
-                "category":    _safe_str(best_row.get("Categorie", "Microbiote")),
+                "category":    best.category,
                 "title":       f"{bact_name} ({'eleve' if is_elevated else 'reduit'}, niv {abundance_level:+d})",
                 "biomarker":   bact_name,
                 "value":       abundance_level,
                 "direction":   "HAUTE" if is_elevated else "BASSE",
                 "norm":        "Expected (0)",
-                "recommendations": {
-                    "interpretation": _safe_str(best_row.get("Interpretation_clinique")),
-                    "nutrition":      _safe_str(best_row.get("Recommandations_nutritionnelles")),
-                    "supplementation":_safe_str(best_row.get("Recommandations_supplementation")),
-                    "lifestyle":      _safe_str(best_row.get("Recommandations_lifestyle")),
-                    "monitoring":     _safe_str(best_row.get("Notes_additionnelles")),
-                },
-            })
+                "recommendations": best.payload,
+            }
+            t0 = time.perf_counter()
 
         # ── Source 2 : stool_biomarkers ──────────────────────────────────────
         stool = microbiome_data.get("stool_biomarkers", {})
@@ -380,20 +1244,24 @@ class RulesEngine:
 
                 direction = "HAUTE" if is_high else "BASSE"
                 prio = "HIGH" if "TRES" in status or "TRÈS" in status else "MEDIUM"
+                matched += 1
                 triggered += 1
 
                 # Chercher règle associée
-                bm_norm = _normalize(bm_name)
-                best_row_s = None
-                for rk, rdf in self._micro_index.items():
-                    if bm_norm in rk or rk in bm_norm:
-                        for _, rr in rdf.iterrows():
-                            g = _parse_gravite(rr.get("Niveau_gravite"))
-                            if is_high and g > 0: best_row_s = rr; break
-                            if is_low  and g < 0: best_row_s = rr; break
-                    if best_row_s is not None: break
-
-                results.append({
+                kind = "any" if (is_high and is_low) else ("pos" if is_high else "neg")
+                marker_key, rule = self._stool_rule(_normalize(bm_name), kind)
+                monitoring = f"Val: {val} | Ref: {bm_data.get('reference','')}"
+                if rule is not None:
+                    hits.append((marker_key, direction))
+                    recs = rule.payload.with_extra(monitoring=monitoring)
+                else:
+                    recs = {
+                        "interpretation": "", "nutrition": "", "supplementation": "", "lifestyle": "",
+                        "monitoring": monitoring,
+                    }
+
+                elapsed += time.perf_counter() - t0
+                yield {
                     "rule_type":   "microbiome",
                     "priority":    prio,
                     "category":    "Biomarqueurs fecaux",
@@ -402,18 +1270,32 @@ class RulesEngine:
                     "value":       val,
                     "direction":   direction,
                     "norm":        _safe_str(bm_data.get("reference", "")),
-                    "recommendations": {
-                        "interpretation": _safe_str(best_row_s.get("Interpretation_clinique") if best_row_s is not None else ""),
-                        "nutrition":      _safe_str(best_row_s.get("Recommandations_nutritionnelles") if best_row_s is not None else ""),
-                        "supplementation":_safe_str(best_row_s.get("Recommandations_supplementation") if best_row_s is not None else ""),
-                        "lifestyle":      _safe_str(best_row_s.get("Recommandations_lifestyle") if best_row_s is not None else ""),
-                        "monitoring":     f"Val: {val} | Ref: {bm_data.get('reference','')}",
-                    },
-                })
+                    "recommendations": recs,
+                }
+                t0 = time.perf_counter()
 
         msg = f"  [Microbiome] {len(bacteria)} bacteries | {triggered} declenches"
-        print(msg); self.debug_log.append(msg)
-        return results
+        _echo(msg); trace.log(msg)
+        elapsed += time.perf_counter() - t0
+        self._record_stage(trace, "MICROBIOME", elapsed, matched, triggered, hits)
+
+    def _stool_rule(self, bm_norm: str, kind: str) -> Tuple[Optional[str], Optional[_MicroRule]]:
+        """
+        Règle d'un biomarqueur fécal : premier marqueur (ordre de la feuille) lié par
+        sous-chaîne qui possède une ligne de gravité du bon signe. Mémoïsé par (nom, signe).
+        Retourne (clé du marqueur, règle), (None, None) sans règle.
+        """
+        key = (bm_norm, kind)
+        if key not in self._stool_memo:
+            found = (None, None)
+            for i in self._micro_names.resolve(bm_norm)[1]:
+                marker_key = self._micro_names.keys[i]
+                rule = self._micro_rules[marker_key].stool[kind]
+                if rule is not None:
+                    found = (marker_key, rule)
+                    break
+            self._stool_memo[key] = found
+        return self._stool_memo[key]
 
     # ── API publique ─────────────────────────────────────────────────────────
 
@@ -424,23 +1306,175 @@ class RulesEngine:
         sex: str = "H",
         **kw,
     ) -> Dict:
-        bio_data = bio_data or {}
-        self.debug_log.clear()
-        self.debug_log.append(
-            f"generate_recommendations | sex={sex} | {len(bio_data)} biomarqueurs"
-        )
+        result, _ = self.evaluate(bio_data=bio_data, microbiome_data=microbiome_data, sex=sex)
+        return result
 
-        all_recs: List[Dict] = []
-        all_recs.extend(self._apply_bio_sheet(self._df_base,       bio_data, sex, "HIGH",   "BASE"))
-        all_recs.extend(self._apply_bio_sheet(self._df_extended,   bio_data, sex, "HIGH",   "EXTENDED"))
-        all_recs.extend(self._apply_bio_sheet(self._df_functional, bio_data, sex, "MEDIUM", "FONCTIONNEL"))
-        if microbiome_data:
-            all_recs.extend(self._apply_micro_rules(microbiome_data))
+    def evaluate(
+        self,
+        bio_data: Optional[Dict[str, float]] = None,
+        microbiome_data: Optional[Dict] = None,
+        sex: str = "H",
+    ) -> Tuple[Dict, EvaluationTrace]:
+        """
+        Chemin d'évaluation sans état partagé (réentrant, utilisable depuis un pool de threads).
+        Retourne (résultat au format generate_recommendations, trace propre à l'appel).
+        """
+        stream = RecommendationStream(self, bio_data, microbiome_data, sex)
+        return stream.result, stream.trace
+
+    def stream_recommendations(
+        self,
+        bio_data: Optional[Dict[str, float]] = None,
+        microbiome_data: Optional[Dict] = None,
+        sex: str = "H",
+    ) -> "RecommendationStream":
+        """Recos produites au fil de l'évaluation (cf. RecommendationStream)."""
+        return RecommendationStream(self, bio_data, microbiome_data, sex)
+
+    def evaluate_batch(
+        self,
+        patients: pd.DataFrame,
+        sex: Any = "H",
+        sex_column: str = "sex",
+        microbiome_data: Optional[Dict[Any, Dict]] = None,
+    ) -> Dict[Any, Dict]:
+        """
+        Évaluation vectorisée d'une cohorte (re-scoring d'archives après changement du fichier de règles).
+
+        patients : une ligne par patient, une colonne par biomarqueur ; le sexe est lu
+                   dans `sex_column` si la colonne existe, sinon `sex` s'applique à tous.
+        microbiome_data : {index patient: données microbiome} optionnel.
+
+        Les seuils bio sont comparés en bloc (NumPy) contre les normes compilées.
+        Valeur NaN / non numérique = biomarqueur absent. Colonnes de même nom normalisé
+        fusionnées (dernière valeur non nulle).
+        Retourne {index patient: résultat au format generate_recommendations}.
+        """
+        microbiome_data = microbiome_data or {}
+        if sex_column in patients.columns:
+            raw_sex = patients[sex_column].tolist()
+            values  = patients.drop(columns=[sex_column])
+        else:
+            raw_sex = [sex] * len(patients)
+            values  = patients
+        sexes = [_sex_key(s) for s in raw_sex]
+        sex_row = np.array([self._SEX_ROWS[sk] for sk in sexes], dtype=np.intp)
+
+        mat = values.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        n_present = (~np.isnan(mat)).sum(axis=1)
+
+        # Colonnes patient par nom normalisé (dernière valeur non nulle, comme un dict patient)
+        col_keys = [_normalize(c) for c in values.columns]
+        key_pos: Dict[str, int] = {}
+        cols: List[np.ndarray] = []
+        for j, k in enumerate(col_keys):
+            if k not in key_pos:
+                key_pos[k] = len(cols)
+                cols.append(mat[:, j].copy())
+            else:
+                np.copyto(cols[key_pos[k]], mat[:, j], where=~np.isnan(mat[:, j]))
+        V = np.column_stack(cols) if cols else np.empty((len(patients), 0))
+
+        per_patient: List[List[Dict]] = [[] for _ in range(len(patients))]
+        traces = [EvaluationTrace(rulebook_version=self.rulebook_version) for _ in range(len(patients))]
+        for t, s, n in zip(traces, raw_sex, n_present):
+            t.log(f"evaluate_batch | sex={s} | {n} biomarqueurs")
+
+        for key, priority, label in self._BIO_PASSES:
+            rules = self._bio_rules.get(key)
+            if not rules:
+                continue
+            t0 = time.perf_counter()
+            n_matched = n_triggered = 0
+            hits: List[Tuple[str, str]] = []
+            v = self._batch_match(key, col_keys, key_pos, mat, V)
+            # Une passe pour toute la cohorte : bornes du sexe de chaque patient (masque de lignes)
+            low, high = self._get_bio_bounds(key)
+            is_low  = v < low[sex_row]
+            is_high = v > high[sex_row]
+            hit = is_low | is_high
+            matched   = (~np.isnan(v)).sum(axis=1)
+            triggered = hit.sum(axis=1)
+            n_matched   += int(matched.sum())
+            n_triggered += int(triggered.sum())
+            for p, i in zip(*np.nonzero(hit)):
+                rule = rules[i]
+                low_i = bool(is_low[p, i])
+                per_patient[p].append(self._bio_rec(
+                    rule, priority, float(v[p, i]), low_i, rule.norms[sexes[p]][0]
+                ))
+                hits.append((rule.key, "BASSE" if low_i else "HAUTE"))
+            for p, t in enumerate(traces):
+                t.log(f"  [{label}] {n_present[p]} bm | {matched[p]} matches | {triggered[p]} declenches")
+            if self.record_metrics:
+                # Étape propre au lot : un appel = toute la cohorte, sans fausser les temps unitaires
+                METRICS.record_stage(f"BATCH:{label}", time.perf_counter() - t0, n_matched, n_triggered, hits,
+                                     sheet=label)
+
+        results: Dict[Any, Dict] = {}
+        for p, idx in enumerate(patients.index):
+            recs = per_patient[p]
+            micro = microbiome_data.get(idx)
+            if micro:
+                recs.extend(self._apply_micro_rules(micro, traces[p]))
+            results[idx] = self._consolidate(recs, traces[p])
+        return results
+
+    def _batch_match(
+        self,
+        key: str,
+        col_keys: List[str],
+        key_pos: Dict[str, int],
+        mat: np.ndarray,
+        V: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Valeur patient retenue pour chaque règle (n_patients x n_règles, NaN si pas de match).
+        Même priorité que le chemin unitaire : nom exact, puis première colonne renseignée
+        (ordre des colonnes) liée par sous-chaîne.
+        """
+        index = self._bio_index[key]
+        out = np.full((V.shape[0], len(index.keys)), np.nan)
+        for k, g in key_pos.items():
+            for i in index.resolve(k)[0]:
+                out[:, i] = V[:, g]
+        for j, k in enumerate(col_keys):
+            exact, related = index.resolve(k)
+            sub = [i for i in related if i not in exact]
+            if not sub:
+                continue
+            cur = out[:, sub]
+            fill = np.isnan(cur) & ~np.isnan(mat[:, j])[:, None]
+            out[:, sub] = np.where(fill, V[:, [key_pos[k]]], cur)
+        return out
+
+    def _get_bio_bounds(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bornes (low, high) d'une feuille bio, tableaux (2, n_règles) alignés sur les règles :
+        ligne _SEX_ROWS['H'] / _SEX_ROWS['F'] (repli F -> 'Normes H' déjà résolu), NaN si absente.
+        """
+        bounds = self._bio_bounds.get(key)
+        if bounds is None:
+            rules = self._bio_rules.get(key) or []
+            low, high = (
+                np.array([[np.nan if r.norms[sk][j] is None else r.norms[sk][j] for r in rules]
+                          for sk in self._SEX_ROWS], dtype=np.float64).reshape(len(self._SEX_ROWS), len(rules))
+                for j in (1, 2)
+            )
+            bounds = self._bio_bounds[key] = (low, high)
+        return bounds
 
+    def _precompute_bounds(self):
+        for key in self._bio_rules:
+            self._get_bio_bounds(key)
+
+    def _consolidate(
+        self, all_recs: List[Dict], trace: EvaluationTrace, dedup_keys: Optional[List[Tuple[str, str]]] = None
+    ) -> Dict:
         # Deduplication (biomarker normalise, direction)
         seen, deduped = set(), []
-        for r in all_recs:
-            key = (_normalize(str(r["biomarker"])), r["direction"])
+        for n, r in enumerate(all_recs):
+            key = dedup_keys[n] if dedup_keys is not None else (_normalize(str(r["biomarker"])), r["direction"])
             if key not in seen:
                 seen.add(key); deduped.append(r)
 
@@ -462,7 +1496,7 @@ class RulesEngine:
         if by_prio["low"]:    parts.append(f"{len(by_prio['low'])} priorite basse")
         summary = ("Analyse : " + ", ".join(parts)) if parts else "Aucune anomalie detectee"
 
-        self.debug_log.append(
+        trace.log(
             f"Total: {len(deduped)} recs | {len(by_prio['high'])} HIGH | "
             f"{len(by_prio['medium'])} MEDIUM | {len(by_prio['low'])} LOW"
         )
@@ -473,7 +1507,8 @@ class RulesEngine:
             "by_priority": by_prio,
             "by_category": by_cat,
             "summary":     summary,
-            "debug_log":   list(self.debug_log),
+            "debug_log":   list(trace.lines),
+            "rulebook_version": trace.rulebook_version,
         }
 
     def generate_consolidated_recommendations(
@@ -486,6 +1521,18 @@ class RulesEngine:
         patient_info = patient_info or {}
         sex = patient_info.get("sex", "H")
         base = self.generate_recommendations(bio_data=bio_data, microbiome_data=microbiome_data, sex=sex)
+        return self._consolidated_view(base, patient_info)
+
+    def start_incremental(
+        self,
+        bio_data: Optional[Dict[str, float]] = None,
+        microbiome_data: Optional[Dict] = None,
+        patient_info: Optional[Dict] = None,
+    ) -> "IncrementalEvaluation":
+        """Évaluation consolidée conservée pour corrections de valeurs (cf. IncrementalEvaluation)."""
+        return IncrementalEvaluation(self, bio_data, microbiome_data, patient_info)
+
+    def _consolidated_view(self, base: Dict, patient_info: Dict) -> Dict:
         n_h = len(base["by_priority"]["high"])
         n_m = len(base["by_priority"]["medium"])
         return {
@@ -502,81 +1549,419 @@ class RulesEngine:
 
     # ── Helpers internes ─────────────────────────────────────────────────────
 
-    def _extract_domain(self, recs: List[Dict], domain: str) -> List[str]:
-        return [v for r in recs
-                for v in [_safe_str((r.get("recommendations") or {}).get(domain))] if v]
+    def _extract_domain(self, recs: List[Dict], domain: str) -> DomainTexts:
+        return DomainTexts(recs, domain)
 
     def _build_therapeutic_axes(self, recs: List[Dict]) -> Dict[str, List]:
-        axes = {k: [] for k in ["metabolisme","inflammation","hormones","micronutrition",
-                                 "microbiome","cardiovasculaire","autre"]}
-        kws = {
-            "metabolisme":      ["metabol","glyc","insuline","glucose","lipide","trigly","homa"],
-            "inflammation":     ["inflamm","crp","cytokine","oxydatif","ferritine","fibrinogene","calprotect"],
-            "hormones":         ["hormone","thyroid","cortisol","testosteron","oestrog","dhea","tsh"],
-            "micronutrition":   ["vitamine","mineral","magnesium","zinc","omega","selenium","b12","folate","coenzyme","carnitine"],
-            "microbiome":       ["bacterie","firmicute","bacteroidote","lactobacil","bifidobacter","akkermansia",
-                                 "faecalibacterium","commensals","cross feeder","inflammatory","opportunistic",
-                                 "microbiome","microbiote","fecal"],
-            "cardiovasculaire": ["cardio","cholesterol","hdl","ldl","triglycer","homocysteine","apob","apoa"],
-        }
+        axes = {k: [] for k in _AXES}
         for rec in recs:
-            text = " ".join([
-                _normalize(rec.get("category", "")),
-                _normalize(rec.get("title", "")),
-                _normalize(rec.get("biomarker", "")),
-            ])
-            placed = False
-            for axis, keywords in kws.items():
-                if any(kw in text for kw in keywords):
-                    axes[axis].append(rec); placed = True; break
-            if not placed: axes["autre"].append(rec)
+            axes[_rec_axis(rec)].append(rec)
         return {k: v for k, v in axes.items() if v}
 
     # ── Diagnostics ──────────────────────────────────────────────────────────
 
     def get_rules_summary(self) -> Dict[str, int]:
+        meta = self._sheet_meta()
+        rows = lambda label: meta[label][0] if meta.get(label) else 0
         return {
-            "bio_base":       len(self._df_base)       if self._df_base       is not None else 0,
-            "bio_extended":   len(self._df_extended)   if self._df_extended   is not None else 0,
-            "bio_functional": len(self._df_functional) if self._df_functional is not None else 0,
-            "microbiome":     len(self._df_micro)      if self._df_micro      is not None else 0,
-            "micro_marqueurs":len(self._micro_index),
+            "bio_base":       rows("BASE"),
+            "bio_extended":   rows("EXTENDED"),
+            "bio_functional": rows("FONCTIONNEL"),
+            "microbiome":     rows("MICROBIOME"),
+            "micro_marqueurs":len(self._micro_rules),
         }
 
-    def get_column_report(self) -> Dict[str, List[str]]:
+    def get_unfired_rules(self) -> Dict[str, List[str]]:
+        """Règles bio jamais déclenchées d'après METRICS (depuis le démarrage ou le dernier reset)."""
+        fired = {(sheet, rule) for sheet, rule, _ in METRICS.rule_hits()}
         return {
-            label: list(df.columns) if df is not None else []
-            for label, df in [
-                ("BASE", self._df_base), ("EXTENDED", self._df_extended),
-                ("FONCTIONNEL", self._df_functional), ("MICROBIOME", self._df_micro),
-            ]
+            label: [r.name for r in self._bio_rules.get(key) or [] if (label, r.key) not in fired]
+            for key, _, label in self._BIO_PASSES
         }
 
+    def get_column_report(self) -> Dict[str, List[str]]:
+        return {label: list(m[1]) if m else [] for label, m in self._sheet_meta().items()}
+
+    _DIAG_NORM_COLS = ("Normes H", "Normes F")
+
+    def _diag_table(self, label: str) -> Optional[Tuple[_NameIndex, List[Tuple[str, Dict]]]]:
+        """
+        Feuille bio telle que la lit le diagnostic (toutes les lignes, colonnes 'Normes H' /
+        'Normes F' brutes, sans repli F -> H) : compilée une fois, indexée par nom normalisé.
+        None si la feuille est absente.
+        """
+        table = self._diag_tables.get(label)
+        if table is None:
+            rows = self._diag_rows(label)
+            if rows is None:
+                return None
+            table = self._diag_tables[label] = (_NameIndex([_normalize(br) for br, _ in rows]), rows)
+        return table
+
+    def _diag_rows(self, label: str) -> Optional[List[Tuple[str, Dict]]]:
+        if self._mapped is not None:
+            p = f"diag.{label}."
+            if p + "name" not in self._mapped:
+                return None
+            strings = self._mapped.strings
+            norm, low, high = (self._mapped.array(p + "norm"), self._mapped.array(p + "low"),
+                               self._mapped.array(p + "high"))
+            opt = lambda x: None if np.isnan(x) else float(x)
+            return [
+                (strings[sid], {
+                    col: (strings[norm[i, j]], (opt(low[i, j]), opt(high[i, j])))
+                    for j, col in enumerate(self._DIAG_NORM_COLS)
+                })
+                for i, sid in enumerate(self._mapped.array(p + "name"))
+            ]
+        df = getattr(self, self._SHEET_ATTRS[label])
+        if df is None:
+            return None
+        rows = []
+        for row in df.to_dict("records"):
+            norms = {}
+            for col in self._DIAG_NORM_COLS:
+                norm_raw = row.get(col)
+                norms[col] = (_safe_str(norm_raw), _parse_norm(norm_raw))
+            rows.append((_safe_str(row.get("Biomarqueur", "")), norms))
+        return rows
+
     def diagnose_biomarker(self, biomarker_name: str, value: float, sex: str = "H") -> Dict:
-        bn = _normalize(biomarker_name)
+        return self.diagnose_panel({biomarker_name: value}, sex)[biomarker_name]
+
+    def diagnose_panel(self, bio_data: Dict[str, float], sex: str = "H") -> Dict[str, Dict]:
+        """
+        diagnose_biomarker pour tout un panel : {libellé: rapport}, mêmes rapports par feuille
+        (lignes liées par égalité ou sous-chaîne, norme du sexe, déclenchement), résolus par
+        l'index des noms plutôt qu'un parcours des feuilles par biomarqueur.
+        """
         norm_col = "Normes H" if str(sex).upper() in ("H", "M") else "Normes F"
-        report = {"biomarker": biomarker_name, "normalized": bn, "sheets": {}}
-        for label, df in [
-            ("BASE", self._df_base), ("EXTENDED", self._df_extended), ("FONCTIONNEL", self._df_functional)
-        ]:
-            if df is None: report["sheets"][label] = "absente"; continue
-            matches = []
-            for _, row in df.iterrows():
-                br = _safe_str(row.get("Biomarqueur", ""))
-                brn = _normalize(br)
-                if not (bn == brn or bn in brn or brn in bn): continue
-                norm_raw = row.get(norm_col)
-                low, high = _parse_norm(norm_raw)
-                matches.append({
-                    "rule_bm": br,
-                    "norm":    _safe_str(norm_raw),
-                    "parsed":  (low, high),
-                    "would_trigger": (low is not None and value < low) or (high is not None and value > high),
-                })
-            report["sheets"][label] = matches or "aucun match"
-        return report
+        sheets = [(label, self._diag_table(label)) for label in ("BASE", "EXTENDED", "FONCTIONNEL")]
+        reports = {}
+        for biomarker_name, value in bio_data.items():
+            bn = _normalize(biomarker_name)
+            report = {"biomarker": biomarker_name, "normalized": bn, "sheets": {}}
+            for label, table in sheets:
+                if table is None: report["sheets"][label] = "absente"; continue
+                index, rows = table
+                matches = []
+                for i in index.resolve(bn)[1]:
+                    br, norms = rows[i]
+                    norm_txt, (low, high) = norms[norm_col]
+                    matches.append({
+                        "rule_bm": br,
+                        "norm":    norm_txt,
+                        "parsed":  (low, high),
+                        "would_trigger": (low is not None and value < low) or (high is not None and value > high),
+                    })
+                report["sheets"][label] = matches or "aucun match"
+            reports[biomarker_name] = report
+        return reports
 
     def __repr__(self) -> str:
         s = self.get_rules_summary()
-        return (f"<RulesEngine v3.2 | base={s['bio_base']} ext={s['bio_extended']} "
+        return (f"<RulesEngine v{ENGINE_VERSION} | base={s['bio_base']} ext={s['bio_extended']} "
                 f"fonct={s['bio_functional']} micro={s['microbiome']} marqueurs={s['micro_marqueurs']}>")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Évaluation en flux
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RecommendationStream:
+    """
+    Itérer produit chaque reco dès qu'elle se déclenche (feuilles bio dans l'ordre des passes,
+    puis microbiote), dédupliquée au fil de l'eau : un doublon (biomarqueur normalisé,
+    direction) n'est jamais émis. En fin de flux, result = résultat de generate_recommendations
+    et consolidated() = celui de generate_consolidated_recommendations ; les demander avant la
+    fin consomme le reste du flux.
+
+        stream = engine.stream_recommendations(bio, micro, sex)
+        for rec in stream:
+            if rec["priority"] == "HIGH": afficher(rec)
+        final = stream.consolidated(patient_info)
+    """
+
+    def __init__(
+        self,
+        engine: RulesEngine,
+        bio_data: Optional[Dict[str, float]] = None,
+        microbiome_data: Optional[Dict] = None,
+        sex: str = "H",
+    ):
+        self.engine          = engine
+        self.bio_data        = bio_data or {}
+        self.microbiome_data = microbiome_data
+        self.sex             = sex
+        self.trace = EvaluationTrace(rulebook_version=engine.rulebook_version)
+        self._recs: List[Dict] = []
+        self._keys: List[Tuple[str, str]] = []
+        self._result: Optional[Dict] = None
+        self._gen = self._run()
+
+    def _run(self) -> Iterator[Dict]:
+        self.trace.log(f"generate_recommendations | sex={self.sex} | {len(self.bio_data)} biomarqueurs")
+        seen = set()
+        for source in self._sources():
+            for rec in source:
+                key = (_normalize(str(rec["biomarker"])), rec["direction"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                self._recs.append(rec)
+                self._keys.append(key)
+                yield rec
+
+    def _sources(self) -> Iterator[Iterator[Dict]]:
+        for key, priority, label in self.engine._BIO_PASSES:
+            yield self.engine._iter_bio_sheet(key, self.bio_data, self.sex, priority, label, self.trace)
+        if self.microbiome_data:
+            yield self.engine._iter_micro_rules(self.microbiome_data, self.trace)
+
+    def __iter__(self) -> "RecommendationStream":
+        return self
+
+    def __next__(self) -> Dict:
+        return next(self._gen)
+
+    @property
+    def emitted(self) -> List[Dict]:
+        """Recos déjà émises (dédupliquées, ordre de déclenchement)."""
+        return list(self._recs)
+
+    @property
+    def result(self) -> Dict:
+        if self._result is None:
+            for _ in self._gen:
+                pass
+            self._result = self.engine._consolidate(self._recs, self.trace, self._keys)
+        return self._result
+
+    def consolidated(self, patient_info: Optional[Dict] = None) -> Dict:
+        return self.engine._consolidated_view(self.result, patient_info or {})
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Réévaluation incrémentale
+# ─────────────────────────────────────────────────────────────────────────────
+
+class IncrementalEvaluation:
+    """
+    Résultat consolidé conservé avec son état de matching, pour réappliquer
+    rapidement la correction d'une ou deux valeurs bio par le clinicien.
+
+    - `dependencies` : {biomarqueur patient normalisé: {(feuille, id règle)}} des lignes matchées
+    - update({libellé: valeur | None}) ne réévalue que les règles dépendant des biomarqueurs
+      modifiés (rematching complet d'une feuille seulement si un biomarqueur apparaît ou
+      disparaît), réutilise les recommandations, clés de dédup et axes inchangés.
+    - Le microbiote n'est évalué qu'une fois (non concerné par les corrections bio).
+    """
+
+    def __init__(
+        self,
+        engine: RulesEngine,
+        bio_data: Optional[Dict[str, float]] = None,
+        microbiome_data: Optional[Dict] = None,
+        patient_info: Optional[Dict] = None,
+    ):
+        self.engine          = engine
+        self.bio_data        = dict(bio_data or {})
+        self.microbiome_data = microbiome_data
+        self.patient_info    = patient_info or {}
+        self.sex             = self.patient_info.get("sex", "H")
+        self._sk             = _sex_key(self.sex)
+
+        micro_trace = EvaluationTrace()
+        self._micro_recs = engine._apply_micro_rules(microbiome_data, micro_trace) if microbiome_data else []
+        self._micro_log  = micro_trace.lines
+        self._micro_keys = [(_normalize(str(r["biomarker"])), r["direction"]) for r in self._micro_recs]
+
+        self._bio_norm = engine._patient_index(self.bio_data)
+        # feuille -> {"assigned": {id règle: nom patient}, "recs": {id règle: rec}}
+        self._sheets: Dict[str, Dict[str, Dict]] = {}
+        self.dependencies: Dict[str, set] = {}
+        for key, priority, _ in engine._BIO_PASSES:
+            if not engine._bio_rules.get(key):
+                continue
+            self._sheets[key] = {"assigned": engine._assign_bio(key, self._bio_norm), "recs": {}}
+            self._index_deps(key)
+            for i in self._sheets[key]["assigned"]:
+                self._eval(key, priority, i)
+        self.result = self._build()
+
+    def _index_deps(self, key: str):
+        for deps in self.dependencies.values():
+            deps.difference_update({d for d in deps if d[0] == key})
+        for i, kn in self._sheets[key]["assigned"].items():
+            self.dependencies.setdefault(kn, set()).add((key, i))
+
+    def _eval(self, key: str, priority: str, i: int):
+        sheet = self._sheets[key]
+        kn  = sheet["assigned"].get(i)
+        rec = None
+        if kn is not None:
+            rec = self.engine._eval_bio_rule(
+                self.engine._bio_rules[key][i], self._sk, priority, self._bio_norm[kn][1]
+            )
+        if rec is None:
+            sheet["recs"].pop(i, None)
+        else:
+            sheet["recs"][i] = rec
+
+    def update(self, changes: Dict[str, Optional[float]]) -> Dict:
+        """Applique {libellé biomarqueur: nouvelle valeur (None = supprimé)} et renvoie le résultat consolidé."""
+        for k, v in changes.items():
+            if v is None:
+                self.bio_data.pop(k, None)
+            else:
+                self.bio_data[k] = v
+
+        old_norm = self._bio_norm
+        self._bio_norm = new_norm = self.engine._patient_index(self.bio_data)
+        changed = {kn for kn, (_, v) in new_norm.items() if kn not in old_norm or old_norm[kn][1] != v}
+        changed |= old_norm.keys() - new_norm.keys()
+        same_keys = list(old_norm) == list(new_norm)
+
+        for key, priority, _ in self.engine._BIO_PASSES:
+            sheet = self._sheets.get(key)
+            if sheet is None:
+                continue
+            if same_keys:
+                # Même panel : le matching est inchangé, seules les règles dépendantes bougent
+                affected = {i for kn in changed for k, i in self.dependencies.get(kn, ()) if k == key}
+            else:
+                previous = sheet["assigned"]
+                sheet["assigned"] = self.engine._assign_bio(key, new_norm)
+                self._index_deps(key)
+                affected = {
+                    i for i in previous.keys() | sheet["assigned"].keys()
+                    if previous.get(i) != sheet["assigned"].get(i) or sheet["assigned"].get(i) in changed
+                }
+            for i in affected:
+                self._eval(key, priority, i)
+
+        self.dependencies = {kn: deps for kn, deps in self.dependencies.items() if deps}
+        self.result = self._build()
+        return self.result
+
+    def _build(self) -> Dict:
+        engine = self.engine
+        trace = EvaluationTrace(rulebook_version=engine.rulebook_version)
+        trace.log(f"generate_recommendations | sex={self.sex} | {len(self.bio_data)} biomarqueurs")
+
+        all_recs: List[Dict] = []
+        keys: List[Tuple[str, str]] = []
+        for key, _, label in engine._BIO_PASSES:
+            sheet = self._sheets.get(key)
+            if sheet is None:
+                continue
+            rules = engine._bio_rules[key]
+            for i in sorted(sheet["recs"]):
+                rec = sheet["recs"][i]
+                all_recs.append(rec)
+                keys.append((rules[i].key, rec["direction"]))
+            trace.log(f"  [{label}] {len(self.bio_data)} bm | {len(sheet['assigned'])} matches | "
+                      f"{len(sheet['recs'])} declenches")
+        for line in self._micro_log:
+            trace.log(line)
+        all_recs.extend(self._micro_recs)
+        keys.extend(self._micro_keys)
+
+        base = engine._consolidate(all_recs, trace, keys)
+        return engine._consolidated_view(base, self.patient_info)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Rechargement à chaud
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RulesEngineReloader:
+    """
+    Surveille le classeur de règles et recharge le moteur sans redémarrer les workers.
+
+    - Détection par (mtime, taille) du fichier, vérifiée par un thread d'arrière-plan (start())
+      ou à la demande (check()).
+    - Le nouveau moteur est construit et validé hors de tout chemin d'évaluation, puis
+      substitué par une simple assignation de référence (atomique).
+    - `engine` renvoie le moteur courant : un appelant qui a pris sa référence termine
+      son évaluation sur l'ancienne version ; 'rulebook_version' du résultat l'indique.
+    - Un classeur invalide (lecture impossible, feuilles bio absentes...) est ignoré :
+      l'ancien moteur reste en place et l'erreur est exposée dans `last_error`.
+    """
+
+    def __init__(self, rules_excel_path: str, poll_interval: float = 5.0, **engine_kw):
+        self.rules_excel_path = rules_excel_path
+        self.poll_interval    = poll_interval
+        self._engine_kw       = engine_kw
+        self._reload_lock     = threading.Lock()
+        self._stop            = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self._stamp  = self._file_stamp()
+        self._engine = RulesEngine(rules_excel_path, **engine_kw)
+
+    @property
+    def engine(self) -> RulesEngine:
+        return self._engine
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.rules_excel_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def _validate(engine: RulesEngine):
+        summary = engine.get_rules_summary()
+        if not (summary["bio_base"] or summary["bio_extended"] or summary["bio_functional"]):
+            raise ValueError("aucune regle bio chargee")
+        # Évaluation de contrôle : hors METRICS (ce n'est pas un appel patient)
+        engine.record_metrics = False
+        try:
+            engine.generate_recommendations(bio_data={}, microbiome_data=None)
+        finally:
+            engine.record_metrics = True
+
+    def check(self) -> bool:
+        """Recharge si le fichier a changé. Retourne True si un nouveau moteur a été installé."""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self._reload_lock:
+            if stamp == self._stamp:
+                return False
+            try:
+                new = RulesEngine(self.rules_excel_path, **self._engine_kw)
+                self._validate(new)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._stamp = stamp
+                return False
+            self._stamp = stamp
+            self.last_error = None
+            if new.rulebook_hash == self._engine.rulebook_hash:
+                return False
+            self._engine = new
+            if new.use_cache or new.columnar:
+                new.prune_cache()
+            return True
+
+    def start(self) -> "RulesEngineReloader":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="rules-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
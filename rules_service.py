@@ -0,0 +1,407 @@
+"""
+ALGO-LIFE - Service local d'évaluation des règles
+
+Un process serveur (HTTP sur localhost ou socket Unix) charge le règlement une fois au
+format colonnaire (cf. rules_columnar) ; les évaluations tournent dans un pool de process
+dont chaque worker mappe le même fichier -> moteur chaud partagé par l'UI, les jobs de
+re-scoring et l'export PDF, sur plusieurs cœurs, indépendamment de Streamlit.
+Le classeur est surveillé (RulesEngineReloader) : un nouveau règlement remplace le pool.
+Un worker mort (OOM, plantage d'une extension C) casse le pool : il est recréé à la
+requête suivante, qui est rejouée une fois ; /health le signale ("degraded") entre-temps.
+
+    python rules_service.py --port 8765 --workers 4
+    python rules_service.py --unix /tmp/algolife-rules.sock
+
+Endpoints (JSON) :
+    GET  /health          statut, rulebook_version, workers
+    GET  /rules           get_rules_summary()
+    POST /evaluate        {bio_data, microbiome_data, sex}          -> generate_recommendations
+    POST /consolidated    {bio_data, microbiome_data, patient_info} -> generate_consolidated_recommendations
+    POST /batch           {patients: [{...}, ...], consolidated: bool} -> liste de résultats
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from rules_engine import RulesEngine, RulesEngineReloader
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULES = os.path.join(BASE_DIR, "data", "Bases_regles_Synlab.xlsx")
+MAX_BODY = 20 * 2**20
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Côté worker
+# ─────────────────────────────────────────────────────────────────────────────
+
+_worker_engine: Optional[RulesEngine] = None
+
+
+def _init_worker(columnar_path: str):
+    global _worker_engine
+    _worker_engine = RulesEngine.from_columnar(columnar_path)
+
+
+def _json_default(obj: Any) -> Any:
+    """Types non natifs des résultats moteur (RuleText, DomainTexts) -> dict / list."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, Sequence):
+        return list(obj)
+    raise TypeError(f"{type(obj).__name__} non serialisable")
+
+
+def _evaluate_one(req: Dict[str, Any], consolidated: bool) -> Dict:
+    if consolidated:
+        return _worker_engine.generate_consolidated_recommendations(
+            bio_data=req.get("bio_data") or {},
+            microbiome_data=req.get("microbiome_data"),
+            patient_info=req.get("patient_info") or {},
+        )
+    return _worker_engine.generate_recommendations(
+        bio_data=req.get("bio_data") or {},
+        microbiome_data=req.get("microbiome_data"),
+        sex=req.get("sex", "H"),
+    )
+
+
+def _run_task(kind: str, payload: Dict[str, Any]) -> bytes:
+    """Exécuté dans le pool : renvoie directement le JSON encodé."""
+    if kind == "batch":
+        cons = bool(payload.get("consolidated"))
+        out: Any = [_evaluate_one(p, cons) for p in payload.get("patients") or []]
+    else:
+        out = _evaluate_one(payload, kind == "consolidated")
+    return json.dumps(out, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Serveur
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _check_number(v: Any) -> bool:
+    if isinstance(v, bool):
+        return False
+    if v is None or isinstance(v, (int, float)):
+        return True
+    try:
+        float(v)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _validate_patient(req: Any, where: str = ""):
+    """Forme d'une requête patient (ValueError -> 400) : bio_data {nom: nombre|null},
+    microbiome_data objet|null, patient_info objet|null, sex chaîne."""
+    if not isinstance(req, dict):
+        raise ValueError(f"{where or 'requete'} : objet attendu")
+    where = f"{where}." if where else ""
+    bio = req.get("bio_data")
+    if bio is not None:
+        if not isinstance(bio, dict):
+            raise ValueError(f"{where}bio_data : objet attendu")
+        bad = [k for k, v in bio.items() if not _check_number(v)]
+        if bad:
+            raise ValueError(f"{where}bio_data : valeur non numerique pour {', '.join(bad[:5])}")
+    micro = req.get("microbiome_data")
+    if micro is not None:
+        if not isinstance(micro, dict):
+            raise ValueError(f"{where}microbiome_data : objet ou null attendu")
+        for name in ("bacteria_individual", "bacteria_groups", "bacteria"):
+            items = micro.get(name)
+            if items is None:
+                continue
+            if not isinstance(items, list) or not all(isinstance(b, dict) for b in items):
+                raise ValueError(f"{where}microbiome_data.{name} : liste d'objets attendue")
+            if any(isinstance(b.get("abundance_level"), bool)
+                   or not isinstance(b.get("abundance_level", 0), int) for b in items):
+                raise ValueError(f"{where}microbiome_data.{name} : abundance_level entier attendu")
+        stool = micro.get("stool_biomarkers")
+        if stool is not None and not (isinstance(stool, dict) and all(isinstance(v, dict) for v in stool.values())):
+            raise ValueError(f"{where}microbiome_data.stool_biomarkers : objet d'objets attendu")
+    if req.get("patient_info") is not None and not isinstance(req["patient_info"], dict):
+        raise ValueError(f"{where}patient_info : objet attendu")
+    if "sex" in req and not isinstance(req["sex"], str):
+        raise ValueError(f"{where}sex : chaine attendue")
+
+
+def validate_request(kind: str, payload: Dict[str, Any]):
+    """Vérifie la forme d'une requête avant envoi au pool : erreur client -> ValueError."""
+    if kind != "batch":
+        return _validate_patient(payload)
+    patients = payload.get("patients")
+    if patients is None:
+        return
+    if not isinstance(patients, list):
+        raise ValueError("patients : liste attendue")
+    for i, p in enumerate(patients):
+        _validate_patient(p, f"patients[{i}]")
+
+class RulesService:
+    """Moteur chaud + pool de workers sur le même règlement colonnaire."""
+
+    def __init__(self, rules_excel_path: str = DEFAULT_RULES, workers: Optional[int] = None,
+                 poll_interval: float = 5.0):
+        self.workers  = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.reloader = RulesEngineReloader(rules_excel_path, poll_interval=poll_interval, columnar=True)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_hash = ""
+        self.pool_restarts = 0
+        self._ensure_pool()
+
+    def _pool_broken(self) -> bool:
+        # Positionné par l'executor dès qu'un worker disparaît
+        return self._pool is None or bool(getattr(self._pool, "_broken", False))
+
+    def _ensure_pool(self, failed: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+        """Pool courant ; recréé si le règlement a changé ou si le pool est cassé.
+        failed : pool sur lequel une requête vient d'échouer (déjà remplacé par un autre
+        thread -> rien à faire)."""
+        engine = self.reloader.engine
+        with self._lock:
+            broken = self._pool is not None and (self._pool is failed or self._pool_broken())
+            if self._pool is None or broken or self._pool_hash != engine.rulebook_hash:
+                if broken:
+                    self.pool_restarts += 1
+                # Fichier colonnaire du cache ; à défaut (cache non inscriptible) export temporaire
+                path = engine._mapped.path if engine._mapped is not None else engine.export_columnar(
+                    os.path.join(tempfile.gettempdir(), f"algolife-rules-{engine.rulebook_version}.alrb")
+                )
+                old = self._pool
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(path,),
+                )
+                self._pool_hash = engine.rulebook_hash
+                if old is not None:
+                    old.shutdown(wait=False)
+            return self._pool
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> bytes:
+        pool = self._ensure_pool()
+        try:
+            return self._submit(pool, kind, payload)
+        except BrokenProcessPool:
+            # Worker mort : pool recréé, requête rejouée une fois (évaluation sans effet de bord)
+            return self._submit(self._ensure_pool(failed=pool), kind, payload)
+
+    def _submit(self, pool: ProcessPoolExecutor, kind: str, payload: Dict[str, Any]) -> bytes:
+        patients = payload.get("patients") or [] if kind == "batch" else None
+        if not patients or len(patients) < 2 * self.workers:
+            return pool.submit(_run_task, kind, payload).result()
+        # Lot réparti sur les workers, tableaux JSON recollés dans l'ordre
+        step = -(-len(patients) // self.workers)
+        futures = [
+            pool.submit(_run_task, kind, {**payload, "patients": patients[i:i + step]})
+            for i in range(0, len(patients), step)
+        ]
+        parts = [f.result()[1:-1] for f in futures]
+        return b"[" + b",".join(p for p in parts if p) + b"]"
+
+    def health(self) -> Dict[str, Any]:
+        """status "degraded" : pool cassé (recréé à la prochaine requête) ou dernier
+        rechargement du classeur en échec (l'ancien règlement reste servi)."""
+        engine = self.reloader.engine
+        with self._lock:
+            broken = self._pool_broken()
+        return {
+            "status":           "degraded" if broken or self.reloader.last_error else "ok",
+            "rulebook_version": engine.rulebook_version,
+            "workers":          self.workers,
+            "pool_broken":      broken,
+            "pool_restarts":    self.pool_restarts,
+            "reload_error":     self.reloader.last_error,
+        }
+
+    def start(self) -> "RulesService":
+        self.reloader.start()
+        return self
+
+    def close(self):
+        self.reloader.stop()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: RulesService = None   # injecté par make_server
+    protocol_version = "HTTP/1.1"
+
+    _POST = {"/evaluate": "evaluate", "/consolidated": "consolidated", "/batch": "batch"}
+
+    def address_string(self) -> str:
+        # socket Unix : client_address vide
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        if os.getenv("ALGOLIFE_RULES_VERBOSE", "") == "1":
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, body: bytes):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code: int, msg: str):
+        self._send(code, json.dumps({"error": msg}, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, json.dumps(self.service.health()).encode("utf-8"))
+        elif self.path == "/rules":
+            self._send(200, json.dumps(self.service.reloader.engine.get_rules_summary()).encode("utf-8"))
+        else:
+            self._error(404, f"inconnu : {self.path}")
+
+    def do_POST(self):
+        kind = self._POST.get(self.path)
+        if kind is None:
+            return self._error(404, f"inconnu : {self.path}")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self._error(400, "Content-Length invalide")
+        if length > MAX_BODY:
+            return self._error(413, "requete trop volumineuse")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("objet JSON attendu")
+        except ValueError as e:
+            return self._error(400, f"JSON invalide : {e}")
+        try:
+            validate_request(kind, payload)
+        except ValueError as e:
+            return self._error(400, f"requete invalide : {e}")
+        try:
+            body = self.service.submit(kind, payload)
+        except Exception as e:
+            return self._error(500, f"{type(e).__name__}: {e}")
+        self._send(200, body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o660)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(service: RulesService, host: str = "127.0.0.1", port: int = 8765,
+                unix_socket: Optional[str] = None) -> socketserver.BaseServer:
+    handler = type("RulesHandler", (_Handler,), {"service": service})
+    if unix_socket:
+        return _UnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Client
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class RulesClient:
+    """Client minimal (stdlib) : RulesClient(port=8765) ou RulesClient(unix_socket=...)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 unix_socket: Optional[str] = None, timeout: float = 60.0):
+        self.host, self.port, self.unix_socket, self.timeout = host, port, unix_socket, timeout
+
+    def _conn(self) -> http.client.HTTPConnection:
+        if self.unix_socket:
+            return _UnixConnection(self.unix_socket, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Any:
+        conn = self._conn()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            data = json.loads(resp.read() or b"null")
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError(f"rules_service {resp.status}: {(data or {}).get('error')}")
+        return data
+
+    def health(self) -> Dict:
+        return self._request("GET", "/health")
+
+    def evaluate(self, bio_data: Dict[str, float], microbiome_data: Optional[Dict] = None,
+                 sex: str = "H") -> Dict:
+        return self._request("POST", "/evaluate",
+                             {"bio_data": bio_data, "microbiome_data": microbiome_data, "sex": sex})
+
+    def consolidated(self, bio_data: Dict[str, float], microbiome_data: Optional[Dict] = None,
+                     patient_info: Optional[Dict] = None) -> Dict:
+        return self._request("POST", "/consolidated",
+                             {"bio_data": bio_data, "microbiome_data": microbiome_data,
+                              "patient_info": patient_info or {}})
+
+    def batch(self, patients: List[Dict], consolidated: bool = False) -> List[Dict]:
+        return self._request("POST", "/batch", {"patients": patients, "consolidated": consolidated})
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Service local d'évaluation des règles ALGO-LIFE")
+    ap.add_argument("--rules", default=DEFAULT_RULES, help="classeur de règles (.xlsx)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unix", dest="unix_socket", help="socket Unix (remplace host/port)")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    service = RulesService(args.rules, workers=args.workers).start()
+    server = make_server(service, args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"rules_service {service.health()['rulebook_version']} | {service.workers} workers | {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())